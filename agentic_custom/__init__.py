@@ -1,3 +1,6 @@
+import functools
+import importlib
+
 from .agent.tooling.tools_context import ToolsContext, tool
 from .agent.tooling import Tool, Argument, AgentTerminationException
 from .config import (
@@ -8,33 +11,69 @@ from .config import (
 )
 from .prompt_factory import PromptFactory
 from .agent import Agent, RoundPromise
-from .run_tracker import LLMRunTracker
-from .llms import LLM, LLMTimeoutException
-
-from .llms.ollama_llm import OllamaLLM
-from .llms.azure_llm import AzureLLM
-from .llms.openai_llm import OpenaiLLM
-from .llms.anthropic_llm import AnthropicLLM, AnthropicAzureLLM
-
-PROVIDERS_MAP = {
-    "ollama": OllamaLLM,
-    "azure_openai": AzureLLM,
-    'openai': OpenaiLLM,
-    'anthropic': AnthropicLLM,
-    'azure_anthropic': AnthropicAzureLLM,
+from .run_tracker import LLMRunTracker, AsyncRunTracker
+from .run_visualize import RunVisualizer
+from .llms import LLM, LLMTimeoutException, build_http_client
+from .llm_cache import LLMCache, MemoryBackend, FileBackend, RedisBackend
+
+# Providers are imported on first use, so that only the SDKs of the providers actually in use are loaded.
+_PROVIDER_PATHS = {
+    "ollama": (".llms.ollama_llm", "OllamaLLM"),
+    "azure_openai": (".llms.azure_llm", "AzureLLM"),
+    'openai': (".llms.openai_llm", "OpenaiLLM"),
+    'anthropic': (".llms.anthropic_llm", "AnthropicLLM"),
+    'azure_anthropic': (".llms.anthropic_llm", "AnthropicAzureLLM"),
 }
 
+def _get_provider(provider_name: str):
+    module_name, class_name = _PROVIDER_PATHS[provider_name]
+    return getattr(importlib.import_module(module_name, __name__), class_name)
+
+def __getattr__(name: str):
+    # keeps `from agentic_custom import AzureLLM` and PROVIDERS_MAP working with the lazy imports
+    if name == 'PROVIDERS_MAP':
+        # provider name -> LLM class. Imports all the providers (and their SDKs)
+        return {provider_name: _get_provider(provider_name) for provider_name in _PROVIDER_PATHS}
+    for provider_name, (_, class_name) in _PROVIDER_PATHS.items():
+        if class_name == name:
+            return _get_provider(provider_name)
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+
 def check_llm_provider_requirements(provider_name: str) -> str:
     """Checks if the necessary requirements are met for the given LLM provider."""
-    if provider_name not in PROVIDERS_MAP:
+    if provider_name not in _PROVIDER_PATHS:
         return f"Provider {provider_name} not found"
-    return PROVIDERS_MAP[provider_name].check_requirements()
+    return _get_provider(provider_name).check_requirements()
+
+@functools.lru_cache(maxsize=None)
+def _get_shared_http_client(connect_timeout: float, pool_max_idle_per_host: int, keepalive_expiry: float):
+    """Process-wide keep-alive HTTP client, shared by all the LLMs loaded with the same pool settings."""
+    return build_http_client(
+        connect_timeout=connect_timeout,
+        pool_max_idle_per_host=pool_max_idle_per_host,
+        keepalive_expiry=keepalive_expiry,
+    )
 
-def load_llm(provider_name: str, model_name: str, *args, **kwargs):
-    """Loads an LLM from the given provider and model name."""
-    if provider_name not in PROVIDERS_MAP:
+def load_llm(
+    provider_name: str,
+    model_name: str,
+    *args,
+    connect_timeout: float = 10,
+    pool_max_idle_per_host: int = 32,
+    keepalive_expiry: float = 60,
+    **kwargs
+):
+    """
+    Loads an LLM from the given provider and model name.
+    Providers whose SDK accepts an external HTTP client share a process-wide connection pool, so TCP/TLS connections are reused across calls and LLMs.
+    Pass http_client explicitly to opt out.
+    """
+    if provider_name not in _PROVIDER_PATHS:
         raise ValueError(f"Provider {provider_name} not found")
-    return PROVIDERS_MAP[provider_name](model_name, *args, **kwargs)
+    llm_class = _get_provider(provider_name)
+    if llm_class.SUPPORTS_HTTP_CLIENT and 'http_client' not in kwargs:
+        kwargs['http_client'] = _get_shared_http_client(connect_timeout, pool_max_idle_per_host, keepalive_expiry)
+    return llm_class(model_name, *args, **kwargs)
 
 __all__ = [
     "ToolsContext",
@@ -44,10 +83,16 @@ __all__ = [
     "Agent",
     "AgentTerminationException",
     "LLMRunTracker",
+    "AsyncRunTracker",
+    "RunVisualizer",
     "LLM",
     "check_llm_provider_requirements",
     "load_llm",
     "LLMTimeoutException",
+    "LLMCache",
+    "MemoryBackend",
+    "FileBackend",
+    "RedisBackend",
     "RoundPromise",
     "PromptFactory",
     "AgenticConfig",
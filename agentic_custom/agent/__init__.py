@@ -1,16 +1,32 @@
+import asyncio
 import copy
+import random
+import time
+import warnings
+from concurrent.futures import ThreadPoolExecutor
 from dataclasses import dataclass
 from enum import Enum
-from typing import Dict, Any, List, Generator
+from typing import Dict, Any, List, Generator, AsyncGenerator
 from dataclasses import dataclass
 from uuid import uuid4
 
-from ..llms import LLM, LLMResponse, LLMContentFilteringException
+from ..llms import LLM, LLMResponse, LLMContentFilteringException, LLMTimeoutException
 from ..run_tracker import LLMRunTracker
 from .tooling.tools_context import ToolsContext
 from ..run_tracker import DEFAULT_CONTEXT_KEY
 from ..context import MessageHistory
 from .round_promise import RoundPromise
+from .tooling import get_shared_tool_executor
+from ..llm_cache import LLMCache
+from ..config import get_config
+
+PARALLEL_TOOLS_HINT = (
+    "When you need multiple independent pieces of information, emit all tool calls in a single response so they can run in parallel; "
+    "emit them sequentially only when a later call depends on an earlier result."
+)
+
+# upper bound of the backoff between two attempts of an LLM call, in seconds
+LLM_RETRY_MAX_DELAY = 30.
 
 class Agent:
     """
@@ -21,6 +37,13 @@ class Agent:
     """
     output_model = None
     system_prompt = None
+    # if True and more than one tool is enabled, PARALLEL_TOOLS_HINT is appended to the system prompt of the agent loop
+    encourage_parallel_tools = True
+    # if True, warn when the end of round hook rewrites the first round of the history, which invalidates the provider-side prompt cache
+    PREFIX_STABLE = True
+
+    # (agent class, system role name) -> system message, shared by all the agents of the class. The messages are never mutated.
+    _SYSTEM_MSG_CACHE: Dict[tuple, Dict[str, Any]] = {}
 
     @staticmethod
     def generate_id() -> str:
@@ -32,9 +55,13 @@ class Agent:
             tools_context: ToolsContext,
             message_history: MessageHistory=None,
             max_iterations: int=2**8,
-            generation_params: Dict[str, Any]={},
+            generation_params: Dict[str, Any]=None,
             run_tracker: LLMRunTracker=None,
-
+            tool_concurrency_limit: int=None,
+            cache: LLMCache=None,
+            llm_retry_max: int=3,
+            llm_retry_base: float=1.,
+            fit_context: bool=False,
         ):
         self.llm = llm
         self.id = self.generate_id()
@@ -45,30 +72,143 @@ class Agent:
         #self.tools_context = tools_context.register_to_agent(self)
         self.tools_context = tools_context
         self.max_iterations = max_iterations
-        self.generation_params = generation_params
+        self.generation_params = {} if generation_params is None else generation_params
         if run_tracker is None:
             self.run_tracker = LLMRunTracker(self.llm)
         else:
             self.run_tracker = run_tracker
             self.run_tracker.set_llm(self.llm)
 
-    def execute(self, messages: List[Dict[str, Any]], **kargs):
-        # Use configuration parameters if not overridden in kargs
-        generation_params = self.generation_params.copy()
-        
-        # Override with any parameters passed in kargs
-        generation_params.update(kargs)
-
-        return self.llm.generate(
-            messages,
-            format=self.output_model,
-            **generation_params
-        )
+        # optional cache of the LLM responses for deterministic generation parameters
+        self.cache = cache
+
+        # on LLMTimeoutException, an LLM call is retried up to llm_retry_max times with exponential backoff (plus jitter) starting at llm_retry_base seconds
+        self.llm_retry_max = llm_retry_max
+        self.llm_retry_base = llm_retry_base
+        # if True, the messages of each LLM call are trimmed to the context window of the LLM (see LLM.fit_context). The history is not modified
+        self.fit_context = fit_context
+
+        # The default hooks are no-ops: only call the ones a subclass overrides
+        self._has_get_response_hook = self._overrides_hook('_get_response_hook')
+        self._has_after_tool_execution_hook = self._overrides_hook('_after_tool_execution_hook')
+        self._has_end_round_hook = self._overrides_hook('_end_round_messages_transformation_hook')
+
+        # If set, the tool calls of a round are executed on a pool of at most tool_concurrency_limit threads owned by the agent.
+        # Otherwise, each tool call runs on its own async runner.
+        # The pool is also lent to ToolsContext.schemas_for and shared with the clones of the agent; it lives until close is called.
+        self.tool_concurrency_limit = tool_concurrency_limit
+        self._owns_tool_executor = tool_concurrency_limit is not None
+        if tool_concurrency_limit is None:
+            self._tool_executor = None
+        else:
+            self._tool_executor = ThreadPoolExecutor(max_workers=tool_concurrency_limit, thread_name_prefix='agent-tool')
+
+    def _overrides_hook(self, name: str) -> bool:
+        return getattr(type(self), name) is not getattr(Agent, name)
+
+    def _cache_lookup(self, messages: List[Dict[str, Any]], generation_params: Dict[str, Any], tools_prerendered: bytes=None):
+        """ Returns the cache key of the request (None if not cacheable) and the cached response, if any."""
+        if self.cache is None:
+            return None, None
+        key = self.cache.cache_key(self.llm.model_name, messages, generation_params, format=self.output_model, tools_serialized=tools_prerendered)
+        if key is None:
+            return None, None
+        response = self.cache.get(self.llm, key)
+        self.run_tracker.add_cache_lookup(hit=response is not None)
+        return key, response
+
+    def _get_tool_executor(self):
+        """ The pool the tool calls run on: the agent's own, else the shared one if configured, else None (one runner per tool call)."""
+        if self._tool_executor is not None:
+            return self._tool_executor
+        max_parallel_tools = get_config().max_parallel_tools
+        if max_parallel_tools is None:
+            return None
+        return get_shared_tool_executor(max_parallel_tools)
+
+    def _retry_delay(self, attempt: int) -> float:
+        # the backoff is capped at half the bound, so that with the jitter (up to the backoff itself) the delay stays within
+        # LLM_RETRY_MAX_DELAY, and the retries are still spread once the cap is reached
+        delay = min(LLM_RETRY_MAX_DELAY / 2, self.llm_retry_base * 2 ** attempt)
+        # jitter, so that agents timing out together do not retry together
+        return delay + random.uniform(0, delay)
+
+    def _prerender_tool_schemas(self, tool_schemas: List[Dict[str, Any]]):
+        """ Serializes the tool schemas once per agent loop, for the cache keys. None if there is no cache."""
+        if self.cache is None:
+            return None
+        return self.cache.serialize_tools(tool_schemas)
+
+    def execute(self, messages: List[Dict[str, Any]], tools_prerendered: bytes=None, **kargs):
+        if 'tools' in kargs and not kargs['tools']:
+            # no tools enabled: leave the field out of the request
+            del kargs['tools']
+        # Use configuration parameters if not overridden in kargs. The dict is shared when there is nothing to
+        # override, it is only read (and unpacked) from here on
+        generation_params = self.generation_params if not kargs else {**self.generation_params, **kargs}
+        if self.fit_context:
+            messages = self.llm.fit_context(messages, generation_params.get('tools'), generation_params.get('max_tokens'))
+
+        key, response = self._cache_lookup(messages, generation_params, tools_prerendered)
+        if response is not None:
+            return response
+
+        for attempt in range(self.llm_retry_max + 1):
+            try:
+                response = self.llm.generate(
+                    messages,
+                    format=self.output_model,
+                    **generation_params
+                )
+                break
+            except LLMTimeoutException:
+                # only this call is retried, the rest of the round is untouched
+                if attempt == self.llm_retry_max:
+                    raise
+                time.sleep(self._retry_delay(attempt))
+        if key is not None:
+            self.cache.set(key, response)
+        return response
          
+    async def aexecute(self, messages: List[Dict[str, Any]], tools_prerendered: bytes=None, **kargs):
+        if 'tools' in kargs and not kargs['tools']:
+            del kargs['tools']
+        generation_params = self.generation_params if not kargs else {**self.generation_params, **kargs}
+        if self.fit_context:
+            messages = self.llm.fit_context(messages, generation_params.get('tools'), generation_params.get('max_tokens'))
+
+        key, response = self._cache_lookup(messages, generation_params, tools_prerendered)
+        if response is not None:
+            return response
+
+        for attempt in range(self.llm_retry_max + 1):
+            try:
+                response = await self.llm.agenerate(
+                    messages,
+                    format=self.output_model,
+                    **generation_params
+                )
+                break
+            except LLMTimeoutException:
+                if attempt == self.llm_retry_max:
+                    raise
+                await asyncio.sleep(self._retry_delay(attempt))
+        if key is not None:
+            self.cache.set(key, response)
+        return response
+
+    def _get_system_message(self) -> Dict[str, Any]:
+        key = (type(self), self.llm.SYSTEM_ROLE_NAME)
+        system_message = self._SYSTEM_MSG_CACHE.get(key)
+        # the system prompt can still be overridden per instance, or set on the class after the first call
+        if system_message is None or system_message['content'] is not self.system_prompt:
+            system_message = {'role': key[1], 'content': self.system_prompt}
+            if 'system_prompt' not in vars(self):
+                self._SYSTEM_MSG_CACHE[key] = system_message
+        return system_message
+
     def get_ancestor_messages(self, user_data: str):
-        messages = [
-            {'role': self.llm.SYSTEM_ROLE_NAME, 'content': self.system_prompt},
-        ]
+        messages = [self._get_system_message()]
         if user_data:
             messages.append({'role': 'user', 'content': user_data})
         return messages
@@ -80,9 +220,113 @@ class Agent:
         return response
 
     def generate_tool_schemas(self, enabled_tools_keys: List[str]=None):
-        if enabled_tools_keys is not None:
-            self.tools_context.tools = [tool for tool in self.tools_context.tools if tool.name in enabled_tools_keys]
-        return [self.llm.make_schema_for_tool(tool) for tool in self.tools_context.tools]
+        # memoized by the tools context, per LLM class and set of enabled tools
+        return self.tools_context.schemas_for(self.llm, enabled_tools_keys, executor=self._tool_executor)
+
+    def _prepare_agent_loop(self, input_args, reset_message_history: bool, enabled_tools_keys: List[str]):
+        # list schemas for tools
+        tool_schemas = self.generate_tool_schemas(enabled_tools_keys=enabled_tools_keys)
+
+        if reset_message_history:
+            self.message_history.reset()
+            # get initial messages if not provided
+            initial_messages = self.get_ancestor_messages(*input_args)
+            if self.encourage_parallel_tools and len(tool_schemas) > 1:
+                initial_messages = self._add_parallel_tools_hint(initial_messages)
+            self.message_history.add_messages(0, initial_messages)
+
+        return tool_schemas
+
+    def _add_parallel_tools_hint(self, messages: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+        if not messages or not isinstance(messages[0], dict) or messages[0].get('role') != self.llm.SYSTEM_ROLE_NAME:
+            return messages
+        system_message = messages[0]
+        content = system_message.get('content')
+        if not isinstance(content, str):
+            return messages
+        # new dict, the system message is shared (see _get_system_message)
+        return [{**system_message, 'content': f"{content}\n\n{PARALLEL_TOOLS_HINT}"}] + messages[1:]
+
+    def _record_response(self, i: int, round_output: RoundPromise, response: LLMResponse, verbose, context_key):
+        round_output.set_response(response)
+        self.run_tracker.add_message(response, verbose, context_key=context_key)
+
+        # update history with model answer
+        self.message_history.add_messages(i, response.message)
+
+        if self._has_get_response_hook:
+            self._get_response_hook(i, response, self.message_history)
+
+    def _partition_tool_calls(self, round_output_promises: List[RoundPromise]):
+        """ Splits the round outputs of a round into the ones whose tool is flagged with serialize and the others, keeping their order."""
+        is_serialized = self.tools_context.is_serialized
+        serialized, parallel = [], []
+        for round_output in round_output_promises:
+            (serialized if is_serialized(round_output.tool_call.tool_name) else parallel).append(round_output)
+        return serialized, parallel
+
+    def _record_tool_results(self, i: int, round_output_promises: List[RoundPromise], verbose) -> int:
+        """ Bookkeeping of the executed tool calls of a round, in their original order. Returns the termination mask of the round."""
+        add_message = self.message_history.add_message
+        add_tool_result = self.run_tracker.add_tool_result
+        termination_mask = 0
+        for round_output in round_output_promises:
+
+            tool_call = round_output.tool_call
+
+            tool_message = tool_call.generate_tool_response_message()
+            # update history with tool result
+            add_message(i, tool_message)
+
+            # log tool result for stats tracking
+            add_tool_result(tool_call, verbose)
+            if self._has_after_tool_execution_hook:
+                self._after_tool_execution_hook(i, tool_call, tool_message)
+
+            if tool_call.is_termination:
+                # Termination requested
+                round_output.set_termination(RoundPromise.TERM_MASK_REQUESTED)
+                # the remaining results are still recorded: every tool call of the assistant turn needs its tool message in the history
+                termination_mask |= RoundPromise.TERM_MASK_REQUESTED
+        return termination_mask
+
+    def _complete_single_shot(self, response: LLMResponse, verbose, context_key) -> RoundPromise:
+        """ Bookkeeping of an agent loop run without tools, which ends after its first response."""
+        round_output = RoundPromise(iteration=0)
+        self._record_response(0, round_output, response, verbose, context_key)
+        round_output.set_termination(RoundPromise.TERM_MASK_COMPLETED)
+        round_output.set_messages_history(self.message_history)
+        self.run_tracker.signal_termination('Task completed', verbose)
+        self.run_tracker.flush()
+        return round_output
+
+    def _check_prefix(self, prefix: List[Dict[str, Any]]):
+        new_prefix = self.message_history.get_messages()[:len(prefix)]
+        if len(new_prefix) != len(prefix) or any(old is not new for old, new in zip(prefix, new_prefix)):
+            warnings.warn(
+                "_end_round_messages_transformation_hook modified the first round of the history, which defeats prompt prefix caching. "
+                "Prune whole rounds after it (see MessageHistory.prune_with_over_pruning), or set PREFIX_STABLE = False.",
+                stacklevel=2,
+            )
+
+    def _end_round(self, i: int, response: LLMResponse):
+        # external hook to transform messages (default behavior is to return the messages as is)
+        if self._has_end_round_hook:
+            if self.PREFIX_STABLE:
+                # copied, the hook can modify the rounds of the history in place
+                prefix = list(self.message_history.messages[0]) if self.message_history.get_messages() else []
+            message_history = self._end_round_messages_transformation_hook(i, self.message_history)
+            if message_history is not self.message_history:
+                self.message_history = message_history
+            if self.PREFIX_STABLE:
+                self._check_prefix(prefix)
+
+        # check if context compaction is required
+        token_utilization = response.get_token_utilization(self.llm)
+        is_context_compaction_required = self.message_history.is_compactaion_required(token_utilization, self.llm)
+        if is_context_compaction_required:
+            ...
+            #self.message_history = ...
 
     def execute_agent_loop(
         self,
@@ -100,14 +344,21 @@ class Agent:
         When a yielded round_output contains a tool call, the caller must call round_output.wait() before advancing the generator (e.g. before the next next() or the next iteration of "for round_output in ..."); otherwise the loop will raise when it checks that the tool has been executed.
         """
 
-        if reset_message_history:
-            self.message_history.reset()
-            # get initial messages if not provided
-            initial_messages = self.get_ancestor_messages(*input_args)
-            self.message_history.add_messages(0, initial_messages)
-       
-        # list schemas for tools
-        tool_schemas = self.generate_tool_schemas(enabled_tools_keys=enabled_tools_keys)
+        tool_schemas = self._prepare_agent_loop(input_args, reset_message_history, enabled_tools_keys)
+        if not tool_schemas:
+            # without tools there is nothing to loop on: a single generation completes the task
+            try:
+                response = self.execute(self.message_history.get_messages(), **kargs)
+            except LLMContentFilteringException as e:
+                response = self._handle_content_filtering_exception(e)
+            yield self._complete_single_shot(response, verbose, context_key)
+            return
+
+        tools_prerendered = self._prerender_tool_schemas(tool_schemas)
+        # bound methods used at every iteration (the message history is not hoisted, the end of round hook can replace it)
+        execute = self.execute
+        add_tool_invocation = self.run_tracker.add_tool_invocation
+        tools_context, tool_executor = self.tools_context, self._get_tool_executor()
         # execute agent loop
         for i in range(self.max_iterations):
 
@@ -115,26 +366,19 @@ class Agent:
             
             # raw response from the model
             try:
-                response = self.execute(self.message_history.get_messages(), tools=tool_schemas, **kargs)
+                response = execute(self.message_history.get_messages(), tools=tool_schemas, tools_prerendered=tools_prerendered, **kargs)
             except LLMContentFilteringException as e:
                 response = self._handle_content_filtering_exception(e)
             except Exception as e:
                 raise e
 
-            round_output.set_response(response)
-            self.run_tracker.add_message(response, verbose, context_key=context_key)
-
-            # log message for stats tracking
-            current_messages = response.message
-            round_output.set_message(current_messages)
-            # update history with model answer
-            self.message_history.add_messages(i, current_messages)
-
-            self._get_response_hook(i, response, self.message_history)
+            self._record_response(i, round_output, response, verbose, context_key)
 
             # if tool calls are present, execute tools
-            terminated = False
+            termination_mask = 0
             if response.tool_calls:
+                # the history does not change until all the tool calls of the round are dispatched, so a single snapshot is shared by all the clones
+                round_output.set_messages_history(self.message_history)
                 round_output_promises = []
                 for tool_call in response.tool_calls:
                     # clone round output to avoid modifying the original object as multiple tool calls may be executed in the same round starting from the same LLM response
@@ -142,62 +386,131 @@ class Agent:
 
                     # log tool invocation for stats tracking
                     round_output.set_tool_call(tool_call)
-                    self.run_tracker.add_tool_invocation(tool_call, verbose)
+                    add_tool_invocation(tool_call, verbose)
+                    round_output_promises.append(round_output)
 
+                serialized, parallel = self._partition_tool_calls(round_output_promises)
+                # tools that are not parallel-safe run one at a time, before the others are started
+                for round_output in serialized:
+                    round_output.tool_call.run_sync(tools_context)
+
+                for round_output in parallel:
                     # execute tool
-                    tool_call.execute(self.tools_context)
+                    round_output.tool_call.execute(tools_context, executor=tool_executor)
 
-                    round_output.set_messages_history(self.message_history)
-                    round_output_promises.append(round_output)
-                    # return control to the caller
+                # return control to the caller, in the order of the tool calls (as aexecute_agent_loop)
+                for round_output in round_output_promises:
                     yield round_output
 
                 # at this point, all tool calls have for this round have started and they are running in parallel.
-
+                # Join the whole batch first, then do the bookkeeping in the original order of the tool calls.
                 for round_output in round_output_promises:
-
-                    tool_call = round_output.tool_call
-
-                    if not tool_call.is_executed():
+                    if not round_output.tool_call.is_executed():
                         # Make sure the tool call has been executed in case of an asynchronous tool call.
                         round_output.wait()
 
-                    tool_message = tool_call.generate_tool_response_message()
-                    # update history with tool result
-                    self.message_history.add_message(i, tool_message)  
-                    
-                    # log tool result for stats tracking
-                    self.run_tracker.add_tool_result(tool_call, verbose)
-                    self._after_tool_execution_hook(i, tool_call, tool_message)
-
-                    if tool_call.is_termination:
-                        # Termination requested
-                        round_output.set_termination(RoundPromise.TERMINATION_REQUESTED)
-                        terminated = True
+                termination_mask |= self._record_tool_results(i, round_output_promises, verbose)
 
             else:
                 # if no tool calls
                 round_output.set_messages_history(self.message_history)
                 yield round_output
 
-            if terminated:
+            if termination_mask:
                 self.run_tracker.signal_termination('Termination requested', verbose)
+                self.run_tracker.flush()
                 # explicit exit-condition met
                 return
 
-            # external hook to transform messages (default behavior is to return the messages as is)
-            self.message_history = self._end_round_messages_transformation_hook(i, self.message_history)
+            self._end_round(i, response)
+        else:
+            # max iterations reached
+            self.run_tracker.signal_termination('Max iterations reached', verbose)
+            self.run_tracker.flush()
+            round_output.set_termination(RoundPromise.TERM_MASK_MAX_ITERS)
+            round_output.set_messages_history(self.message_history)
+            yield round_output
 
-            # check if context compaction is required
-            token_utilization = response.get_token_utilization(self.llm)
-            is_context_compaction_required = self.message_history.is_compactaion_required(token_utilization, self.llm)
-            if is_context_compaction_required:
-                ...
-                #self.message_history = ...
+    async def aexecute_agent_loop(
+        self,
+        input_args,
+        reset_message_history: bool=True,
+        enabled_tools_keys: List[str]=None,
+        verbose=True,
+        context_key=DEFAULT_CONTEXT_KEY,
+        **kargs
+    ) -> AsyncGenerator[RoundPromise, None]:
+        """
+        Asynchronous version of execute_agent_loop.
+        The tool calls of a round run concurrently via asyncio.gather: coroutine tools are awaited, sync tools are offloaded to a worker thread.
+        Yielded round outputs always come with their tool call already executed, so there is no need to call round_output.wait().
+        """
+
+        tool_schemas = self._prepare_agent_loop(input_args, reset_message_history, enabled_tools_keys)
+        if not tool_schemas:
+            try:
+                response = await self.aexecute(self.message_history.get_messages(), **kargs)
+            except LLMContentFilteringException as e:
+                response = self._handle_content_filtering_exception(e)
+            yield self._complete_single_shot(response, verbose, context_key)
+            return
+
+        tools_prerendered = self._prerender_tool_schemas(tool_schemas)
+        aexecute = self.aexecute
+        add_tool_invocation = self.run_tracker.add_tool_invocation
+        tools_context = self.tools_context
+        # execute agent loop
+        for i in range(self.max_iterations):
+
+            round_output = RoundPromise(iteration=i)
+
+            # raw response from the model
+            try:
+                response = await aexecute(self.message_history.get_messages(), tools=tool_schemas, tools_prerendered=tools_prerendered, **kargs)
+            except LLMContentFilteringException as e:
+                response = self._handle_content_filtering_exception(e)
+
+            self._record_response(i, round_output, response, verbose, context_key)
+
+            # if tool calls are present, execute tools
+            termination_mask = 0
+            if response.tool_calls:
+                round_output.set_messages_history(self.message_history)
+                round_output_promises = []
+                for tool_call in response.tool_calls:
+                    round_output = round_output.clone()
+                    round_output.set_tool_call(tool_call)
+                    add_tool_invocation(tool_call, verbose)
+                    round_output_promises.append(round_output)
+
+                serialized, parallel = self._partition_tool_calls(round_output_promises)
+                for round_output in serialized:
+                    await round_output.tool_call.arun(tools_context)
+                await asyncio.gather(*[round_output.tool_call.arun(tools_context) for round_output in parallel])
+
+                for round_output in round_output_promises:
+                    yield round_output
+
+                # bookkeeping stays serial to preserve the ordering of run_tracker and message_history
+                termination_mask |= self._record_tool_results(i, round_output_promises, verbose)
+
+            else:
+                # if no tool calls
+                round_output.set_messages_history(self.message_history)
+                yield round_output
+
+            if termination_mask:
+                self.run_tracker.signal_termination('Termination requested', verbose)
+                self.run_tracker.flush()
+                # explicit exit-condition met
+                return
+
+            self._end_round(i, response)
         else:
             # max iterations reached
             self.run_tracker.signal_termination('Max iterations reached', verbose)
-            round_output.set_termination(RoundPromise.TERMINATION_REASON_MAX_ITERATIONS)
+            self.run_tracker.flush()
+            round_output.set_termination(RoundPromise.TERM_MASK_MAX_ITERS)
             round_output.set_messages_history(self.message_history)
             yield round_output
 
@@ -205,7 +518,7 @@ class Agent:
     def create_tools_context(self, *args, **kwargs):
         raise NotImplementedError("create_tools_context is not implemented")
 
-    # Hook functions
+    # Hook functions. Overrides are detected on the class when the agent is created.
     def _get_response_hook(self, round_number: int, response: LLMResponse, messages: MessageHistory):
         """ Hook function called after the model response is generated """
         ...
@@ -215,7 +528,12 @@ class Agent:
         ...
 
     def _end_round_messages_transformation_hook(self, round_number: int, messages: MessageHistory) -> MessageHistory:
-        """ Hook function called after the round is ended. The value returned is the messages to be used in the next round. This can be used for message filtering and pruning."""
+        """
+        Hook function called after the round is ended. The value returned is the messages to be used in the next round. This can be used for message filtering and pruning.
+        It can either modify messages in place and return it, or return a new MessageHistory. The round outputs already yielded are not affected either way, they hold snapshots of the history.
+        To benefit from provider-side prompt caching, keep the beginning of the history unchanged and prune rarely, in large
+        steps: MessageHistory.prune_with_over_pruning implements this.
+        """
         return messages
 
     def _handle_content_filtering_exception(self, exception: LLMContentFilteringException) -> LLMResponse:
@@ -228,8 +546,26 @@ class Agent:
         """
         new_agent = copy.copy(self)
         new_agent.id = self.generate_id()
+        # the clone uses the tool pool of this agent, which is only shut down by closing this agent
+        new_agent._owns_tool_executor = False
         if self.tools_context is not None:
             new_agent.tools_context = self.tools_context.register_to_agent(new_agent)
         return new_agent
+
+    def close(self):
+        """
+        Shuts down the tool pool of the agent (see tool_concurrency_limit), if it owns one. The agent can still be run afterwards,
+        on the tool runners used without tool_concurrency_limit. Its clones must not be run once it is closed, as they share its pool.
+        Closing a clone does nothing.
+        """
+        if self._owns_tool_executor and self._tool_executor is not None:
+            self._tool_executor.shutdown(wait=False)
+            self._tool_executor = None
+
+    def __enter__(self) -> 'Agent':
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
     #########################################################################################
 
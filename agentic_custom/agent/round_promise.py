@@ -1,12 +1,12 @@
-from dataclasses import dataclass
-from typing import Any, Dict, List
+from dataclasses import dataclass, field, fields, replace
+from typing import Any, Dict, List, Union
 
 from ..context import MessageHistory
 from ..llms import LLMResponse
 from .tooling import ToolCall
 
 
-@dataclass
+@dataclass(slots=True, init=False)
 class RoundPromise:
     """
     Class to store the output of a round of execution of the agent loop.
@@ -16,51 +16,115 @@ class RoundPromise:
 
     Important:
     * Currently, this class is not json-serializable.
+    * The termination reason is stored as a bitmask (termination_mask). The termination argument and set_termination
+      also accept the reason names (e.g., RoundPromise.TERMINATION_REQUESTED), termination returns the name.
     """
 
     TERMINATION_REASON_MAX_ITERATIONS = 'max_iterations'
     TERMINATION_REQUESTED = 'termination_requested'
     TASK_COMPLETED = 'task_completed'
 
+    # termination reasons as bit flags, so that the agent loop can fold them into a single int
+    TERM_MASK_REQUESTED = 1
+    TERM_MASK_MAX_ITERS = 2
+    TERM_MASK_COMPLETED = 4
+
     iteration: int = None
     messages_history: MessageHistory = None
     response: LLMResponse = None
-    message: Dict[str, Any] = None
     tool_call: ToolCall = None
-    termination: str = None
+    termination_mask: int = 0
+    # set by set_message, otherwise message is read from the response
+    _message: List[Dict[str, Any]] = field(default=None, init=False, repr=False)
+
+    def __init__(
+        self,
+        iteration: int = None,
+        messages_history: MessageHistory = None,
+        response: LLMResponse = None,
+        tool_call: ToolCall = None,
+        termination_mask: int = 0,
+        termination: str = None,
+        message: List[Dict[str, Any]] = None,
+    ):
+        self.iteration = iteration
+        self.messages_history = messages_history
+        self.response = response
+        self.tool_call = tool_call
+        self.termination_mask = termination_mask
+        self._message = message
+        if termination is not None:
+            self.set_termination(termination)
+
+    @property
+    def message(self) -> List[Dict[str, Any]]:
+        """ The messages of the model response of the round, unless set explicitly (see set_message)."""
+        if self._message is not None:
+            return self._message
+        return self.response.message if self.response is not None else None
+
+    @message.setter
+    def message(self, message: List[Dict[str, Any]]):
+        self._message = message
+
+    @property
+    def termination(self) -> str:
+        """ Name of the termination reason (None if the round did not terminate the loop)."""
+        # lowest set bit first
+        return _NAME_BY_MASK.get(self.termination_mask & -self.termination_mask)
+
+    @termination.setter
+    def termination(self, termination: str):
+        self.set_termination(termination)
 
     def to_dict(self):
-        return {
-            'iteration': self.iteration,
-            'messages_history': self.messages_history,
-            'response': self.response,
-            'message': self.message,
-            'tool_call': self.tool_call,
-            'termination': self.termination,
-        }
-        
+        # shallow, unlike dataclasses.asdict: the fields hold live objects which must not be deep-copied
+        as_dict = {name: getattr(self, name) for name in _FIELD_NAMES}
+        as_dict['message'] = self.message
+        as_dict['termination'] = self.termination
+        return as_dict
+
     def wait(self, timeout=None):
         """Wait for the tool call to be executed if asynchronous execution is enabled."""
         if self.tool_call is not None:
             self.tool_call.wait(timeout=timeout)
 
     def clone(self):
-        return RoundPromise(**self.to_dict())
+        # shallow copy, the fields are shared with the original object
+        cloned = replace(self)
+        cloned._message = self._message
+        return cloned
 
     def set_response(self, response: LLMResponse):
         self.response = response
 
     def set_messages_history(self, messages: MessageHistory):
-        self.messages_history = messages.clone()
+        self.messages_history = messages.snapshot()
 
-    def set_message(self, message: Dict[str, Any]):
-        self.message = message
+    def set_message(self, message: List[Dict[str, Any]]):
+        self._message = message
 
     def set_tool_call(self, tool_call: ToolCall):
         self.tool_call = tool_call
 
-    def set_termination(self, termination: str):
-        self.termination = termination
+    def set_termination(self, termination: Union[int, str]):
+        """ Sets the termination reason, given as a mask (e.g., RoundPromise.TERM_MASK_REQUESTED) or as a name (e.g., RoundPromise.TERMINATION_REQUESTED)."""
+        if isinstance(termination, str):
+            termination = _MASK_BY_NAME[termination]
+        elif termination is None:
+            termination = 0
+        self.termination_mask = termination
 
     def have_tools_been_called(self):
-        return self.tool_call is not None
\ No newline at end of file
+        return self.tool_call is not None
+
+
+_NAME_BY_MASK = {
+    RoundPromise.TERM_MASK_REQUESTED: RoundPromise.TERMINATION_REQUESTED,
+    RoundPromise.TERM_MASK_MAX_ITERS: RoundPromise.TERMINATION_REASON_MAX_ITERATIONS,
+    RoundPromise.TERM_MASK_COMPLETED: RoundPromise.TASK_COMPLETED,
+}
+
+_MASK_BY_NAME = {name: mask for mask, name in _NAME_BY_MASK.items()}
+
+_FIELD_NAMES = tuple(field.name for field in fields(RoundPromise) if not field.name.startswith('_'))
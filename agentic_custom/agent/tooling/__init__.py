@@ -1,15 +1,58 @@
+import asyncio
+import concurrent.futures
+import inspect
+import threading
 from dataclasses import dataclass
-from typing import Callable, List, Any, Dict, Type
+from typing import Callable, List, Any, Dict, Sequence, Type
 
 from .async_execution import AsyncRunner
 from .async_execution.async_runner_thread import AsyncRunnerThread
 from .tools_context import ToolsContext
 
+class ExecutorRunner:
+    """ Runs a tool function on a shared concurrent.futures executor (e.g., the tool pool owned by an Agent) instead of a dedicated runner. """
+    def __init__(self, executor: concurrent.futures.Executor):
+        self.executor = executor
+        self._future = None
+
+    def start(self, function: Callable, args: tuple):
+        self._future = self.executor.submit(function, *args)
+
+    def wait(self, timeout=None):
+        if self._future is not None:
+            concurrent.futures.wait([self._future], timeout=timeout)
+
+_shared_tool_executor = None
+_shared_tool_executor_lock = threading.Lock()
+
+def get_shared_tool_executor(max_workers: int) -> concurrent.futures.ThreadPoolExecutor:
+    """ Process-wide tool pool (see AgenticConfig.max_parallel_tools). It is replaced if max_workers changes."""
+    global _shared_tool_executor
+    with _shared_tool_executor_lock:
+        if _shared_tool_executor is None or _shared_tool_executor._max_workers != max_workers:
+            if _shared_tool_executor is not None:
+                # running tool calls complete on the old pool
+                _shared_tool_executor.shutdown(wait=False)
+            _shared_tool_executor = concurrent.futures.ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix='shared-tool')
+        return _shared_tool_executor
+
 class AgentTerminationException(Exception):
     """ Exception raised when the agent is terminated the execution loop."""
     pass
 
+# Argument.print_argument, the enum line is only present for arguments with an enum
+_ARGUMENT_TEMPLATE = (
+    "  └─ ⚙️  Argument: {name}\n"
+    "     ├─ 📝 Description: {description}\n"
+    "     ├─ 🎯 Type: {type}\n"
+    "{enum}"
+    "     └─ {required_emoji} Required: {required}"
+)
+_ENUM_TEMPLATE = "     ├─ 🔢 Enum: [{values}]\n"
+
 class Argument:
+    __slots__ = ('name', 'description', 'type', 'enum', 'items', 'required', '_rendered')
+
     def __init__(
         self,
         name: str,
@@ -28,38 +71,65 @@ class Argument:
         self.enum = enum
         self.items = items
         self.required = required
+        # output of print_argument, rendered on first call
+        self._rendered = None
 
     def print_argument(self):
-        required_emoji = "✅" if self.required else "❌"
-        enum_str = ""
-        if self.enum:
-            enum_values = ', '.join(map(str, self.enum))
-            enum_str = f"     ├─ 🔢 Enum: [{enum_values}]\n"
-        return (
-            f"  └─ ⚙️  Argument: {self.name}\n"
-            f"     ├─ 📝 Description: {self.description}\n"
-            f"     ├─ 🎯 Type: {self.type}\n"
-            f"{enum_str}"
-            f"     └─ {required_emoji} Required: {self.required}"
+        if self._rendered is None:
+            self._rendered = self._render()
+        return self._rendered
+
+    def _render(self):
+        enum = _ENUM_TEMPLATE.format(values=', '.join(map(str, self.enum))) if self.enum else ""
+        return _ARGUMENT_TEMPLATE.format(
+            name=self.name,
+            description=self.description,
+            type=self.type,
+            enum=enum,
+            required_emoji="✅" if self.required else "❌",
+            required=self.required,
         )
 
 class Tool:
     """
      An helper class used to define a tool. Used for automated schema generation based on the LLM in used.
+     Set serialize=True for tools that are not safe to run concurrently with other tool calls (shared state, blocking user input, ...):
+     in a round, they run one at a time before the other tool calls are started.
     """
+    __slots__ = ('name', 'function', 'description', 'arguments', 'serialize', '_schema_cache', '_rendered')
+
     def __init__(
         self,
         name: str,
         function: Callable,
         description: str,
-        arguments: List[Argument] = [],
+        arguments: Sequence[Argument] = None,
+        serialize: bool = False,
     ):
         self.name = name
         self.function = function
         self.description = description
-        self.arguments = arguments
+        self.arguments = () if arguments is None else tuple(arguments)
+        self.serialize = serialize
+        # LLM class -> schema of the tool, see schema_for
+        self._schema_cache = {}
+        # output of print_tool, rendered on first call
+        self._rendered = None
+
+    def schema_for(self, llm) -> dict:
+        """ Schema of the tool for the given LLM, generated once per LLM class (make_schema_for_tool is a static method of the providers)."""
+        llm_class = type(llm)
+        schema = self._schema_cache.get(llm_class)
+        if schema is None:
+            schema = self._schema_cache[llm_class] = llm.make_schema_for_tool(self)
+        return schema
 
     def print_tool(self):
+        if self._rendered is None:
+            self._rendered = self._render()
+        return self._rendered
+
+    def _render(self):
         lines = [
             "=" * 60,
             f"🔧 Tool: {self.name}",
@@ -102,22 +172,43 @@ class ToolCall:
     def is_executed(self):
         return self.is_tool_invocation_successful is not None
 
+    def _set_exception(self, ex: Exception):
+        self.is_termination = isinstance(ex, AgentTerminationException)
+        self.content = str(ex)
+        # a termination request is a successful invocation
+        self.is_tool_invocation_successful = self.is_termination
+
     def _run_tool(self, tool_context: ToolsContext):
         try:
             self.content = tool_context.tools_functions[self.tool_name](**self.tool_args)
             self.is_termination = False
             self.is_tool_invocation_successful = True
-        except AgentTerminationException as ex:
-            self.is_termination = True
-            self.content = str(ex)
-            self.is_tool_invocation_successful = True
         except Exception as ex:
+            self._set_exception(ex)
+
+    def run_sync(self, tool_context: ToolsContext):
+        """ Execute the tool call in the calling thread."""
+        self._run_tool(tool_context)
+
+    async def arun(self, tool_context: ToolsContext):
+        """ Execute the tool call within an event loop. Coroutine tool functions are awaited, the others are offloaded to a worker thread."""
+        function = tool_context.tools_functions.get(self.tool_name)
+        if not inspect.iscoroutinefunction(function):
+            await asyncio.to_thread(self.run_sync, tool_context)
+            return
+        try:
+            self.content = await function(**self.tool_args)
             self.is_termination = False
-            self.content = str(ex)
-            self.is_tool_invocation_successful = False
+            self.is_tool_invocation_successful = True
+        except Exception as ex:
+            self._set_exception(ex)
 
-    def execute(self, tool_context: ToolsContext):
-        self._runner = self._async_runner_cls()
+    def execute(self, tool_context: ToolsContext, executor: concurrent.futures.Executor = None):
+        """ Start the tool execution. If an executor is given, the tool runs on it, otherwise on a new async runner."""
+        if executor is None:
+            self._runner = self._async_runner_cls()
+        else:
+            self._runner = ExecutorRunner(executor)
         self._runner.start(self._run_tool, (tool_context,))
 
     def wait(self, timeout=None):
@@ -39,5 +39,7 @@ def ask_user_for_input_tool(*args, **kwargs) -> Tool:
                 description="The question to ask the user.",
                 type="string",
             )
-        ]
+        ],
+        # blocks on input(), and concurrent prompts would interleave
+        serialize=True,
     )
@@ -1,10 +1,12 @@
 from __future__ import annotations
 
 import copy
-from typing import List, TYPE_CHECKING
+from concurrent.futures import Executor
+from typing import Any, Dict, List, Tuple, TYPE_CHECKING
 
 if TYPE_CHECKING:
     from agentic_custom.agent import Agent
+    from agentic_custom.llms import LLM
 
 def tool(func):
     """
@@ -52,19 +54,74 @@ class ToolsContext:
     """
     def __init__(self, *args, **kwargs):
         # collect decorated tools from the class
-        self.tools = [
-            getattr(self, attr)() for attr in dir(self) 
-            if callable(getattr(self, attr)) and hasattr(getattr(self, attr), '_is_tool')
-        ]
+        self.tools = [getattr(self, attr)() for attr in self._tool_method_names()]
         # setup tools dictionary
         self.setup_tools()
         # used to store resources needed at runtime
         self.resources = {}
         self.associated_agent = None
 
+    @classmethod
+    def _tool_method_names(cls) -> Tuple[str, ...]:
+        """ Names of the @tool methods of the class, collected on first use and memoized on the class itself (not inherited by subclasses)."""
+        names = cls.__dict__.get('_tool_methods')
+        if names is None:
+            # walk the class dictionaries along the MRO rather than dir(): only the attributes defined on the classes are visited
+            # and properties are not evaluated. The first definition of a name wins, so an override without @tool is not a tool.
+            seen, found = set(), []
+            for klass in cls.__mro__:
+                for name, member in vars(klass).items():
+                    if name in seen:
+                        continue
+                    seen.add(name)
+                    # staticmethod and classmethod objects hold the decorated function
+                    function = getattr(member, '__func__', member)
+                    if callable(function) and getattr(function, '_is_tool', False):
+                        found.append(name)
+            # sorted by name, as before, so that the order of the tools (and of their schemas) does not change
+            names = tuple(sorted(found))
+            cls._tool_methods = names
+        return names
+
     def setup_tools(self):
-        self.tools_functions = {tool.name: tool.function for tool in self.tools}
-        
+        # both indexes are filled in a single pass over the tools
+        self.tools_functions = tools_functions = {}
+        self.tools_by_name = tools_by_name = {}
+        for tool in self.tools:
+            name = tool.name
+            tools_functions[name] = tool.function
+            tools_by_name[name] = tool
+        # (LLM class, enabled tool names) -> tool schemas, see schemas_for
+        self._schema_cache: Dict[tuple, List[Dict[str, Any]]] = {}
+
+    def schemas_for(self, llm: LLM, enabled_tools_keys: List[str]=None, executor: Executor=None) -> List[Dict[str, Any]]:
+        """
+        Returns the schemas of the tools for the given LLM, only for the tools in enabled_tools_keys if it is not None.
+        The list is memoized per LLM class and set of enabled tools, and each schema is generated once per tool (see Tool.schema_for),
+        so a new set of enabled tools reuses the schemas already built.
+        If an executor is given, the missing schemas of a new set of tools are built concurrently on it.
+        """
+        enabled = None if enabled_tools_keys is None else frozenset(enabled_tools_keys)
+        key = (type(llm), enabled)
+        schemas = self._schema_cache.get(key)
+        if schemas is None:
+            # filter without modifying the tools, so that the context can be reused with a different set of enabled tools
+            tools = self.tools
+            if enabled is not None:
+                tools = [tool for tool in tools if tool.name in enabled]
+            if len(tools) > 1 and executor is not None:
+                # schema generation can be slow for some providers (pydantic schema builds, validation calls)
+                schemas = list(executor.map(lambda tool: tool.schema_for(llm), tools))
+            else:
+                schemas = [tool.schema_for(llm) for tool in tools]
+            self._schema_cache[key] = schemas
+        return schemas
+
+    def is_serialized(self, tool_name: str) -> bool:
+        """ Whether the tool must not run concurrently with other tool calls (see Tool.serialize)."""
+        tool = self.tools_by_name.get(tool_name)
+        return tool is not None and tool.serialize
+
     def get_tool_names(self) -> List[str]:
         return [tool.name for tool in self.tools]
 
@@ -84,13 +141,17 @@ class ToolsContext:
         """
         tools_to_add = tool_context_to_add.tools
         if tool_names_to_add is not None:
-            tools_to_add = filter(lambda tool: tool.name in tool_names_to_add, tools_to_add)
+            tool_names_to_add = set(tool_names_to_add)
+            tools_to_add = [tool for tool in tools_to_add if tool.name in tool_names_to_add]
 
         if not tools_to_add:
             raise ValueError(f"No tools to add from {tool_context_to_add}. Double check the tool names.")
 
+        # incremental update: only the added tools are indexed
         self.tools.extend(tools_to_add)
-        self.setup_tools()
+        self.tools_functions.update((tool.name, tool.function) for tool in tools_to_add)
+        self.tools_by_name.update((tool.name, tool) for tool in tools_to_add)
+        self._schema_cache = {}
 
     def register_to_agent(self, agent: Agent) -> ToolsContext:
         """
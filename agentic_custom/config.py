@@ -2,7 +2,7 @@
 
 import os
 from pathlib import Path
-from typing import Union
+from typing import Any, Dict, Optional, Union
 
 # Default root for library-generated files (under the user's home directory).
 DEFAULT_OUTPUT_DIRECTORY: Path = Path.home() / ".agentic_custom"
@@ -33,6 +33,8 @@ class AgenticConfig:
             self._output_directory = Path(DEFAULT_OUTPUT_DIRECTORY)
 
         self._log_messages: bool = False
+        # if set, agents without their own tool_concurrency_limit run tool calls on a process-wide pool of this many threads
+        self._max_parallel_tools: Optional[int] = None
         self._context_compaction_params = {
             'trigger_llm_context_utilization_threshold': 0.8, # trigger compaction when the LLM context utilization is greater than this threshold
             'number_of_rounds_messages_to_preserve': 3, # keep the last N rounds messages in the context
@@ -54,6 +56,14 @@ class AgenticConfig:
     def log_messages(self, value: bool) -> None:
         self._log_messages = value
 
+    @property
+    def max_parallel_tools(self) -> Optional[int]:
+        return self._max_parallel_tools
+
+    @max_parallel_tools.setter
+    def max_parallel_tools(self, value: Optional[int]) -> None:
+        self._max_parallel_tools = value
+
     @property
     def output_directory(self) -> Path:
         return self._output_directory
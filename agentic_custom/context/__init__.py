@@ -1,4 +1,5 @@
-from typing import Any, Dict, List
+from itertools import groupby
+from typing import Any, Callable, Dict, List
 from copy import deepcopy
 
 from ..llms import LLM
@@ -10,31 +11,140 @@ class MessageHistory:
 
 
     def __init__(self):
-        self.messages = []
+        # flat storage: the messages in order and, in a parallel list, the round each message belongs to
+        self._messages = []
+        self._rounds = []
+        # per-round view returned by the messages property, folded back into the flat storage at the next use of the history
+        self._rounds_view = None
+        self._rounds_view_ids = None
         self.config = get_config()
         self.context_compaction_params = self.config.context_compaction_params
 
+    @property
+    def messages(self) -> List[List[Dict[str, Any]]]:
+        """
+        The messages grouped by round, as a list of lists. It can be modified in place or assigned (e.g., by the end of round hook
+        to prune the history): the changes are folded back into the history the next time any other method is called, after which
+        the returned lists are detached from the history.
+        """
+        if self._rounds_view is None:
+            view, view_ids = [], {}
+            for round_id, round_messages in groupby(zip(self._rounds, self._messages), key=lambda item: item[0]):
+                view.append([message for _, message in round_messages])
+                # the list is kept alongside its round, so that its id cannot be reused by a list added to the view
+                view_ids[id(view[-1])] = (view[-1], round_id)
+            self._rounds_view, self._rounds_view_ids = view, view_ids
+        return self._rounds_view
 
-    def add_message(self, round_num: int, message: Dict[str, Any]):
-        if round_num >= len(self.messages):
-            self.messages.append([])
+    @messages.setter
+    def messages(self, messages: List[List[Dict[str, Any]]]):
+        if self._rounds_view_ids is None:
+            self._rounds_view_ids = {}
+        self._rounds_view = messages
+
+    def _fold_rounds_view(self):
+        """ Writes the per-round view (see messages) back into the flat storage."""
+        view, view_ids = self._rounds_view, self._rounds_view_ids
+        self._rounds_view = self._rounds_view_ids = None
+        self._messages, self._rounds = [], []
+        # the rounds added to the view get new round numbers, after the ones already in use, so that they are not merged with
+        # (or pruned together with) an existing round
+        next_round_id = max((round_id for _, round_id in view_ids.values()), default=-1) + 1
+        for round_messages in view:
+            known = view_ids.get(id(round_messages))
+            if known is not None and known[0] is round_messages:
+                round_id = known[1]
+            else:
+                round_id = next_round_id
+                next_round_id += 1
+            self._messages.extend(round_messages)
+            self._rounds.extend([round_id] * len(round_messages))
 
-        self.messages[round_num].append(message)
+    def add_message(self, round_num: int, message: Dict[str, Any]):
+        if self._rounds_view is not None:
+            self._fold_rounds_view()
+        self._messages.append(message)
+        self._rounds.append(round_num)
 
     def add_messages(self, round_num: int, messages: List[Dict[str, Any]]):
-        for message in messages:
-            self.add_message(round_num, message)
+        if self._rounds_view is not None:
+            self._fold_rounds_view()
+        self._messages.extend(messages)
+        self._rounds.extend([round_num] * (len(self._messages) - len(self._rounds)))
 
     def get_messages(self):
-        return sum(self.messages, [])
+        if self._rounds_view is not None:
+            self._fold_rounds_view()
+        return self._messages.copy()
 
     def clone(self):
+        if self._rounds_view is not None:
+            self._fold_rounds_view()
         cloned_messages = MessageHistory()
-        cloned_messages.messages = deepcopy(self.messages)
+        cloned_messages._messages = deepcopy(self._messages)
+        cloned_messages._rounds = self._rounds.copy()
         return cloned_messages
 
+    def snapshot(self):
+        """ Shallow copy of the history: later appends do not affect the snapshot, but the message objects are shared (not to be mutated)."""
+        if self._rounds_view is not None:
+            self._fold_rounds_view()
+        snapshot = MessageHistory()
+        snapshot._messages = self._messages.copy()
+        snapshot._rounds = self._rounds.copy()
+        return snapshot
+
     def reset(self):
-        self.messages = []
+        self._messages = []
+        self._rounds = []
+        self._rounds_view = self._rounds_view_ids = None
+
+    def prune_with_over_pruning(
+        self,
+        num_tokens: int,
+        upper: int,
+        lower: int,
+        count_tokens: Callable[[Any], int] = None,
+        num_rounds_to_preserve: int = None,
+    ) -> bool:
+        """
+        Prunes the history in a way that keeps the prompt prefix stable, so that provider-side prompt caching keeps working.
+        Nothing is dropped while num_tokens (the size of the current context, e.g. the input tokens of the last response) is at most upper.
+        Above it, whole rounds are dropped at once, oldest first, until the estimated size is at most lower: the following rounds
+        then share the new prefix until upper is reached again, instead of shifting the prefix at every round.
+        The first round (system prompt and task) and the last num_rounds_to_preserve rounds (number_of_rounds_messages_to_preserve
+        of the context compaction parameters by default) are never dropped.
+        count_tokens estimates the tokens of a message (default: 4 characters per token). Returns True if any round was dropped.
+        """
+        if self._rounds_view is not None:
+            self._fold_rounds_view()
+        if num_tokens <= upper or not self._rounds:
+            return False
+        if count_tokens is None:
+            count_tokens = lambda message: len(str(message)) // 4
+        if num_rounds_to_preserve is None:
+            num_rounds_to_preserve = self.context_compaction_params['number_of_rounds_messages_to_preserve']
+
+        round_ids = list(dict.fromkeys(self._rounds))
+        droppable = round_ids[1:len(round_ids) - num_rounds_to_preserve]
+
+        round_tokens = {}
+        for round_id, message in zip(self._rounds, self._messages):
+            round_tokens[round_id] = round_tokens.get(round_id, 0) + count_tokens(message)
+
+        dropped = set()
+        for round_id in droppable:
+            if num_tokens <= lower:
+                break
+            dropped.add(round_id)
+            num_tokens -= round_tokens[round_id]
+
+        if not dropped:
+            return False
+        kept = [(round_id, message) for round_id, message in zip(self._rounds, self._messages) if round_id not in dropped]
+        self._rounds = [round_id for round_id, _ in kept]
+        self._messages = [message for _, message in kept]
+        return True
 
     def is_compactaion_required(self, token_utilization: int, llm: LLM) -> bool:
         llm_context_window_size = llm.get_context_window_size()
@@ -1,22 +1,90 @@
+from typing import Optional, Sequence, Tuple, Union
+
 from .prices import prices
 
 BASE = 1_000_000
 
-def cost_calculator(model_name: str, input_tokens: int, output_tokens: int, cached_tokens: int) -> float:
+def get_token_prices(model_name: str) -> Optional[Tuple[float, float, float]]:
+    """
+    Per-token input, output and cached input prices of the model, None if the model is unknown.
+    Meant to be looked up once per model (e.g., by the run tracker) rather than at every cost computation.
+    """
     price = prices.get(model_name, None)
     if price is None:
         return None
 
     input_price = price['input_price']
     output_price = price['output_price']
-    cached_price = price['cached_input_price']
+    # models without a cached input price bill cached tokens as regular input tokens
+    cached_price = price.get('cached_input_price')
+    if cached_price is None:
+        cached_price = input_price
+
+    return input_price / BASE, output_price / BASE, cached_price / BASE
+
+def cost_calculator(model_name: str, input_tokens: int, output_tokens: int, cached_tokens: int = 0) -> float:
+    token_prices = get_token_prices(model_name)
+    if token_prices is None:
+        return None
+    input_price, output_price, cached_price = token_prices
 
     input_tokens = input_tokens - cached_tokens
 
-    input_cost = (input_tokens / BASE) * input_price
-    output_cost = (output_tokens / BASE) * output_price
-    cached_cost = (cached_tokens / BASE) * cached_price
+    input_cost = input_tokens * input_price
+    output_cost = output_tokens * output_price
+    cached_cost = cached_tokens * cached_price
 
     total_cost = input_cost + output_cost + cached_cost
 
     return total_cost
+
+
+_price_table = None
+
+def _get_price_table():
+    """
+    Model name -> row index, and the input, output and cached input price columns, built on first use.
+    The last row is NaN, used for unknown models. Missing cached input prices fall back to the input price.
+    """
+    global _price_table
+    if _price_table is None:
+        import numpy as np
+        names = list(prices)
+        index = {name: i for i, name in enumerate(names)}
+        input_prices = np.array([prices[name]['input_price'] for name in names] + [np.nan], dtype=np.float64)
+        output_prices = np.array([prices[name]['output_price'] for name in names] + [np.nan], dtype=np.float64)
+        cached_prices = np.array(
+            [
+                prices[name]['input_price'] if prices[name].get('cached_input_price') is None else prices[name]['cached_input_price']
+                for name in names
+            ] + [np.nan],
+            dtype=np.float64,
+        )
+        _price_table = index, input_prices, output_prices, cached_prices
+    return _price_table
+
+def cost_calculator_batch(
+    model_names: Union[str, Sequence[str]],
+    input_tokens: Sequence[int],
+    output_tokens: Sequence[int],
+    cached_tokens: Sequence[int],
+):
+    """
+    Vectorized cost_calculator over many calls (e.g., logged runs). Requires numpy (the "cost" extra).
+    model_names is either one model name for all the calls or one per call. Returns an array of costs, NaN for unknown models.
+    """
+    import numpy as np
+    index, input_prices, output_prices, cached_prices = _get_price_table()
+
+    input_tokens = np.asarray(input_tokens, dtype=np.float64)
+    output_tokens = np.asarray(output_tokens, dtype=np.float64)
+    cached_tokens = np.asarray(cached_tokens, dtype=np.float64)
+
+    unknown = len(input_prices) - 1
+    if isinstance(model_names, str):
+        rows = index.get(model_names, unknown)
+    else:
+        rows = np.fromiter((index.get(name, unknown) for name in model_names), dtype=np.intp, count=len(model_names))
+
+    cost = (input_tokens - cached_tokens) * input_prices[rows] + output_tokens * output_prices[rows] + cached_tokens * cached_prices[rows]
+    return cost / BASE
@@ -0,0 +1,192 @@
+"""Exact-match cache for deterministic LLM calls."""
+
+import hashlib
+import json
+import os
+import pickle
+import threading
+from collections import OrderedDict
+from typing import Any, Dict, List, Optional, Protocol
+
+from pydantic import BaseModel
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+from .llms import LLM, LLMResponse, get_json_schema
+from .agent.tooling import ToolCall
+from .config import get_config
+
+LLM_CACHE_DIRECTORY_NAME = "llm_cache"
+
+
+class CacheBackend(Protocol):
+    """Storage used by LLMCache. Values are plain dictionaries of picklable objects."""
+
+    def get(self, key: str) -> Optional[Dict[str, Any]]: ...
+
+    def set(self, key: str, value: Dict[str, Any]) -> None: ...
+
+
+class MemoryBackend:
+    """In-process LRU backend."""
+
+    def __init__(self, max_size: int = 1024):
+        self.max_size = max_size
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key: str) -> Optional[Dict[str, Any]]:
+        with self._lock:
+            value = self._entries.get(key)
+            if value is not None:
+                self._entries.move_to_end(key)
+            return value
+
+    def set(self, key: str, value: Dict[str, Any]) -> None:
+        with self._lock:
+            self._entries[key] = value
+            self._entries.move_to_end(key)
+            if len(self._entries) > self.max_size:
+                self._entries.popitem(last=False)
+
+
+class FileBackend:
+    """One pickle file per entry. Defaults to the ``llm_cache`` directory under the configured output directory."""
+
+    def __init__(self, directory: str = None):
+        if directory is None:
+            directory = os.path.join(get_config().output_directory, LLM_CACHE_DIRECTORY_NAME)
+        self.directory = directory
+        os.makedirs(self.directory, exist_ok=True)
+
+    def _path(self, key: str) -> str:
+        return os.path.join(self.directory, key + ".pkl")
+
+    def get(self, key: str) -> Optional[Dict[str, Any]]:
+        path = self._path(key)
+        if not os.path.exists(path):
+            return None
+        with open(path, "rb") as f:
+            return pickle.load(f)
+
+    def set(self, key: str, value: Dict[str, Any]) -> None:
+        path = self._path(key)
+        # unique per process and thread, the cache directory can be shared by several processes
+        tmp_path = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+        with open(tmp_path, "wb") as f:
+            pickle.dump(value, f)
+        # atomic, so that concurrent readers never see a partial entry
+        os.replace(tmp_path, path)
+
+
+class RedisBackend:
+    """Backend shared across processes and machines. Requires the ``redis`` package."""
+
+    def __init__(self, client=None, prefix: str = "agentic_custom:llm_cache:", ttl: int = None, **redis_kwargs):
+        if client is None:
+            import redis
+            client = redis.Redis(**redis_kwargs)
+        self.client = client
+        self.prefix = prefix
+        self.ttl = ttl
+
+    def get(self, key: str) -> Optional[Dict[str, Any]]:
+        raw = self.client.get(self.prefix + key)
+        if raw is None:
+            return None
+        return pickle.loads(raw)
+
+    def set(self, key: str, value: Dict[str, Any]) -> None:
+        self.client.set(self.prefix + key, pickle.dumps(value), ex=self.ttl)
+
+
+def _to_jsonable(obj: Any) -> Any:
+    """Fallback used to hash provider-specific message objects."""
+    if isinstance(obj, BaseModel):
+        return obj.model_dump(mode="json")
+    if hasattr(obj, "to_dict"):
+        return obj.to_dict()
+    return str(obj)
+
+
+def _serialize(obj: Any) -> bytes:
+    """Canonical (sorted keys) JSON encoding used for hashing. Uses orjson when installed."""
+    if orjson is not None:
+        return orjson.dumps(obj, default=_to_jsonable, option=orjson.OPT_SORT_KEYS | orjson.OPT_NON_STR_KEYS)
+    return json.dumps(obj, sort_keys=True, default=_to_jsonable).encode("utf-8")
+
+
+class LLMCache:
+    """
+    Exact-match cache of LLM responses for deterministic calls, i.e., when the temperature is 0 or not set.
+    Hits skip the LLM round-trip entirely. Tool calls are rebuilt from the cached raw tool calls, so cached responses can be executed as usual.
+    """
+
+    def __init__(self, backend: CacheBackend = None):
+        self.backend = MemoryBackend() if backend is None else backend
+        # lookup counts of this cache instance (the run tracker keeps per-run counts)
+        self.hits = 0
+        self.misses = 0
+
+    @staticmethod
+    def serialize_tools(tool_schemas: List[Dict[str, Any]]) -> bytes:
+        """Pre-renders the tool schemas, so that they are not re-encoded at every cache_key call of an agent loop."""
+        return _serialize(tool_schemas)
+
+    @staticmethod
+    def cache_key(
+        model_name: str,
+        messages: List[Dict[str, Any]],
+        generation_params: Dict[str, Any],
+        format: Optional[BaseModel] = None,
+        tools_serialized: Optional[bytes] = None,
+    ) -> Optional[str]:
+        """
+        Returns the SHA-256 key of the request, or None if the request is not deterministic and must not be cached.
+        If tools_serialized (see serialize_tools) is given, it is used in place of the 'tools' generation parameter.
+        """
+        if generation_params.get("temperature"):
+            return None
+        if tools_serialized is not None:
+            generation_params = {k: v for k, v in generation_params.items() if k != "tools"}
+        payload = {
+            "model": model_name,
+            "messages": messages,
+            "generation_params": generation_params,
+            "format": get_json_schema(format) if format is not None else None,
+        }
+        digest = hashlib.sha256(_serialize(payload))
+        if tools_serialized is not None:
+            digest.update(tools_serialized)
+        return digest.hexdigest()
+
+    def get(self, llm: LLM, key: str) -> Optional[LLMResponse]:
+        entry = self.backend.get(key)
+        if entry is None:
+            self.misses += 1
+            return None
+        self.hits += 1
+        return LLMResponse(
+            message=entry["message"],
+            content=entry["content"],
+            tool_calls=tuple([ToolCall(llm, raw_tool_call) for raw_tool_call in entry["raw_tool_calls"]]),
+            thinking=entry["thinking"],
+            raw_response=entry["raw_response"],
+            structured_response=entry["structured_response"],
+            from_cache=True,
+        )
+
+    def set(self, key: str, response: LLMResponse) -> None:
+        if not response.is_successful():
+            return
+        self.backend.set(key, {
+            "message": response.message,
+            "content": response.content,
+            "raw_tool_calls": [tool_call.raw_tool_call for tool_call in response.tool_calls or []],
+            "thinking": response.thinking,
+            "raw_response": response.raw_response,
+            "structured_response": response.structured_response,
+        })
@@ -1,10 +1,91 @@
-from tkinter.constants import SEL_FIRST
-from typing import List, Dict, Any, Optional, Tuple
-from pydantic import BaseModel
+import asyncio
+import functools
+import importlib.util
+import json
+import weakref
+from concurrent.futures import ThreadPoolExecutor
+from typing import List, Dict, Any, Optional, Sequence, Tuple
+from pydantic import BaseModel, TypeAdapter
 from types import SimpleNamespace
 
 from ..agent.tooling import Tool, ToolCall
 
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+def json_dumps(obj: Any) -> str:
+    """ JSON encoding of tool results sent back to the LLM. Uses orjson when installed. Objects that are not JSON-serializable are encoded with str."""
+    if orjson is not None:
+        try:
+            return orjson.dumps(obj, default=str, option=orjson.OPT_NON_STR_KEYS | orjson.OPT_SERIALIZE_NUMPY).decode()
+        except orjson.JSONEncodeError:
+            # e.g., integers above 64 bits, which orjson rejects without calling default
+            pass
+    return json.dumps(obj, default=str)
+
+def json_loads(data: str) -> Any:
+    """ JSON decoding of the tool call arguments generated by the LLM. Uses orjson when installed."""
+    if orjson is not None:
+        return orjson.loads(data)
+    return json.loads(data)
+
+@functools.lru_cache(maxsize=None)
+def get_json_schema(model: type[BaseModel]) -> Dict[str, Any]:
+    """ JSON schema of a pydantic model, generated once per class."""
+    return model.model_json_schema()
+
+@functools.lru_cache(maxsize=None)
+def get_type_adapter(model: type[BaseModel]) -> TypeAdapter:
+    """ Validator of a structured output format, built once per class."""
+    return TypeAdapter(model)
+
+def build_http_client(
+    async_client: bool = False,
+    connect_timeout: float = 10,
+    pool_max_idle_per_host: int = 32,
+    keepalive_expiry: float = 60,
+):
+    """
+    Keep-alive httpx client (httpx.AsyncClient if async_client) for the provider SDKs.
+    HTTP/2 is enabled when the h2 package is installed (the "http2" extra), so that concurrent requests share a connection.
+    """
+    import httpx
+    client_cls = httpx.AsyncClient if async_client else httpx.Client
+    return client_cls(
+        timeout=httpx.Timeout(60, connect=connect_timeout),
+        **http_pool_kwargs(pool_max_idle_per_host, keepalive_expiry),
+    )
+
+def http_pool_kwargs(pool_max_idle_per_host: int = 32, keepalive_expiry: float = 60) -> Dict[str, Any]:
+    """ httpx client arguments of build_http_client, for the SDKs that create their own httpx client (e.g., ollama)."""
+    import httpx
+    return {
+        'http2': importlib.util.find_spec('h2') is not None,
+        'limits': httpx.Limits(
+            max_keepalive_connections=pool_max_idle_per_host,
+            max_connections=2 * pool_max_idle_per_host,
+            keepalive_expiry=keepalive_expiry,
+        ),
+    }
+
+class LoopLocal:
+    """
+    One object per running event loop, created by factory on first use in each loop (e.g., the asynchronous client of an LLM,
+    whose keep-alive connections belong to the loop they were opened in). Entries go away with their loop.
+    """
+    def __init__(self, factory):
+        self._factory = factory
+        self._instances = weakref.WeakKeyDictionary()
+
+    def get(self):
+        loop = asyncio.get_running_loop()
+        instance = self._instances.get(loop)
+        if instance is None:
+            instance = self._instances[loop] = self._factory()
+        return instance
+
 class LLMTimeoutException(Exception):
     pass
 
@@ -18,12 +99,15 @@ class LLMResponse(SimpleNamespace):
         self, 
         message: Any,
         content: str,
-        tool_calls: List[ToolCall] = [],
+        tool_calls: Sequence[ToolCall] = (),
         thinking: Optional[str] = None,
         raw_response: Optional[Any] = None,
         structured_response: Optional[Any] = None,
         serialized_response: Optional[str] = None,
         error: Optional[Exception] = None,
+        from_cache: bool = False,
+        structured_response_model: Optional[BaseModel] = None,
+        cache_hit: Optional[bool] = None,
     ):
         super().__init__()
         if error:
@@ -33,10 +117,27 @@ class LLMResponse(SimpleNamespace):
         self.tool_calls = tool_calls
         self.thinking = thinking
         self.raw_response = raw_response
+        # the parsed model instance; structured_response (its dictionary dump) is computed on first access
+        self.structured_response_model = structured_response_model
         self.structured_response = structured_response
         self.error = error
+        # True if the response has been served by an LLMCache instead of the LLM
+        self.from_cache = from_cache
+        # outcome of the lookup of the LLM's own cache (e.g., AzureLLM(cache=...)) for this request, None if it has none.
+        # Counted in the cache_stats of the run tracker, as the lookups of the agent's cache
+        self.cache_hit = cache_hit
+
+    @property
+    def structured_response(self) -> Optional[Any]:
+        if self._structured_response is None and self.structured_response_model is not None:
+            self._structured_response = self.structured_response_model.model_dump()
+        return self._structured_response
 
-    def get_token_utilization(self, llm: LLM) -> int:
+    @structured_response.setter
+    def structured_response(self, value: Optional[Any]):
+        self._structured_response = value
+
+    def get_token_utilization(self, llm: 'LLM') -> int:
         input_tokens, output_tokens, reasoning_tokens, cached_tokens = llm.get_num_tokens_response(self)
         return input_tokens + output_tokens
 
@@ -75,6 +176,8 @@ class LLMResponse(SimpleNamespace):
 
 class LLM:
     HAS_COST = False
+    # whether the constructor accepts an http_client argument (e.g., a shared httpx.Client)
+    SUPPORTS_HTTP_CLIENT = False
     DEFAULT_MAX_CONTEXT_WINDOW_SIZE = 200_000
 
     @staticmethod
@@ -92,6 +195,47 @@ class LLM:
     def get_context_window_size(self) -> int:
         return self.DEFAULT_MAX_CONTEXT_WINDOW_SIZE
 
+    def count_tokens(self, messages: List[Dict[str, Any]], tools: Optional[List[Dict[str, Any]]] = None) -> int:
+        """ Approximate number of input tokens of a request (4 characters per token). LLMs with a tokenizer should override it."""
+        return (sum(len(str(message)) for message in messages) + len(str(tools or ''))) // 4
+
+    def is_tool_result_message(self, message: Any) -> bool:
+        """ Whether the message is the result of a tool call, which cannot be sent without the message holding the call. Overridden by the LLMs whose tool results are not 'tool' messages."""
+        return isinstance(message, dict) and message.get('role') == 'tool'
+
+    def fit_context(
+        self,
+        messages: List[Dict[str, Any]],
+        tools: Optional[List[Dict[str, Any]]] = None,
+        max_tokens: Optional[int] = None,
+        safety_margin: int = 1024,
+    ) -> List[Dict[str, Any]]:
+        """
+            Returns the messages trimmed to fit the context window, leaving room for max_tokens output tokens and a safety margin.
+            The leading system message, the first user message (the task) and the most recent messages are kept: messages are dropped
+            from the oldest, right after the first user message, and never so that a tool result (see is_tool_result_message) is left
+            without its tool call. If nothing needs to be dropped, messages is returned as is.
+        """
+        budget = self.get_context_window_size() - (max_tokens or 0) - safety_margin
+        num_tokens = self.count_tokens(messages, tools)
+        if num_tokens <= budget:
+            return messages
+
+        head = 1 if messages and isinstance(messages[0], dict) and messages[0].get('role') == self.SYSTEM_ROLE_NAME else 0
+        if (
+            head < len(messages) - 1 and isinstance(messages[head], dict) and messages[head].get('role') == 'user'
+            and not self.is_tool_result_message(messages[head])
+        ):
+            head += 1
+        start = head
+        # keep at least the last message
+        while start < len(messages) - 1 and num_tokens > budget:
+            num_tokens -= self.count_tokens([messages[start]])
+            start += 1
+        while start < len(messages) - 1 and self.is_tool_result_message(messages[start]):
+            start += 1
+        return messages[:head] + messages[start:]
+
     def __init__(self, model_name: str):
         self.model_name = model_name
         error = self.check_requirements()
@@ -107,6 +251,37 @@ class LLM:
         **kwargs):
         raise NotImplementedError("This method is not implemented for this LLM")
 
+    async def agenerate(self, messages: List[Dict[str, Any]], **kwargs) -> LLMResponse:
+        """
+            Asynchronous version of generate, same arguments and return value.
+            By default, generate is run in a worker thread. LLMs with an asynchronous client should override it.
+        """
+        return await asyncio.to_thread(self.generate, messages, **kwargs)
+
+    def generate_many(self, batches: List[Dict[str, Any]], max_concurrency: int = 8) -> List[LLMResponse]:
+        """
+            Runs independent generations concurrently, at most max_concurrency at a time (to respect the provider rate limits).
+            Each element of batches holds the keyword arguments of one generate call (including messages). The responses are returned in the same order.
+        """
+        if not batches:
+            return []
+        # threads rather than asyncio.run, which would bind the asynchronous clients to a short-lived event loop
+        with ThreadPoolExecutor(max_workers=min(max_concurrency, len(batches)), thread_name_prefix='llm-generate') as executor:
+            return list(executor.map(lambda batch: self.generate(**batch), batches))
+
+    async def agenerate_batch(self, batches: List[Dict[str, Any]], max_concurrency: int = 8) -> List[LLMResponse]:
+        """
+            Asynchronous version of generate_many: the agenerate calls are gathered on the running event loop, at most max_concurrency at a time.
+            Each element of batches holds the keyword arguments of one agenerate call (including messages). The responses are returned in the same order.
+        """
+        semaphore = asyncio.Semaphore(max_concurrency)
+
+        async def bounded_agenerate(batch):
+            async with semaphore:
+                return await self.agenerate(**batch)
+
+        return list(await asyncio.gather(*(bounded_agenerate(batch) for batch in batches)))
+
     def get_tool_name(self, tool_call) -> str:
         raise NotImplementedError("This method is not implemented for this LLM")
 
@@ -1,16 +1,16 @@
-from anthropic import Anthropic, AnthropicFoundry
+from anthropic import Anthropic, AnthropicFoundry, NOT_GIVEN
 import os
-import json
 from typing import List, Dict, Any, Optional
 from pydantic import BaseModel
 
-from . import LLM, LLMResponse
+from . import LLM, LLMResponse, json_dumps
 from ..agent.tooling import ToolCall
 from ..agent.tooling import Tool, ToolCall
 
 class AnthropicLLM(LLM):
 
     HAS_COST = True
+    SUPPORTS_HTTP_CLIENT = True
     SYSTEM_ROLE_NAME = 'system'
 
     DEFAULT_MAX_TOKENS = 64_000
@@ -26,9 +26,9 @@ class AnthropicLLM(LLM):
                 return f"{env_var} is not set"
         return None
 
-    def __init__(self, model_name: str, timeout=None, *args, **kwargs):
+    def __init__(self, model_name: str, timeout=None, http_client=None, *args, **kwargs):
         self.model_name = model_name
-        self.client = Anthropic(timeout=timeout, *args, **kwargs)
+        self.client = Anthropic(timeout=timeout, http_client=http_client, *args, **kwargs)
 
     def _prepare_messages(self, messages: List[Dict[str, Any]]):
         system_prompt = None
@@ -97,7 +97,8 @@ class AnthropicLLM(LLM):
             kwargs['system'] = system_prompt
 
         if native_tools:
-            tools += native_tools
+            # do not extend in place, the tools list is shared across the iterations of the agent loop
+            tools = tools + native_tools
 
         if format:
             gen_function = self.client.messages.parse
@@ -110,7 +111,7 @@ class AnthropicLLM(LLM):
             max_tokens=max_tokens,
             messages=other_messages,
             temperature=temperature,
-            tools=tools,
+            tools=tools or NOT_GIVEN,
             **think,
             **kwargs,
         )
@@ -119,7 +120,7 @@ class AnthropicLLM(LLM):
         content = raw_response_dict['content']
 
         thinking_msgs, text_msgs, structured_msgs, tool_calls_raw = self._filter_messages(content)
-        tool_calls = [ToolCall(self, tool_call) for tool_call in tool_calls_raw]
+        tool_calls = tuple([ToolCall(self, tool_call) for tool_call in tool_calls_raw])
 
         message = {"role": "assistant", "content": raw_response.content}
 
@@ -184,7 +185,7 @@ class AnthropicLLM(LLM):
         if isinstance(tool_call.content, str):
             content = tool_call.content
         else:
-            content = json.dumps(tool_call.content)
+            content = json_dumps(tool_call.content)
 
         return {
             'role': 'user',
@@ -197,6 +198,13 @@ class AnthropicLLM(LLM):
             ]
         }
 
+    def is_tool_result_message(self, message: Any) -> bool:
+        # tool results are user messages holding tool_result blocks, see generate_tool_response_message
+        if not isinstance(message, dict) or message.get('role') != 'user':
+            return False
+        content = message.get('content')
+        return isinstance(content, list) and any(isinstance(block, dict) and block.get('type') == 'tool_result' for block in content)
+
     def get_tool_name(self, tool_call) -> str:
         return tool_call['name']
 
@@ -217,7 +225,7 @@ class AnthropicAzureLLM(AnthropicLLM):
                 return f"{env_var} is not set"
         return None
 
-    def __init__(self, model_name: str, timeout=None, *args, **kwargs):
+    def __init__(self, model_name: str, timeout=None, http_client=None, *args, **kwargs):
         self.model_name = model_name
         api_key = os.getenv(self.AZURE_ANTHROPIC_API_KEY_NAME)
         endpoint = os.getenv(self.AZURE_ANTHROPIC_ENDPOINT_NAME)
@@ -225,6 +233,7 @@ class AnthropicAzureLLM(AnthropicLLM):
             api_key=api_key,
             base_url=endpoint,
             timeout=timeout,
+            http_client=http_client,
             *args,
             **kwargs
         )
@@ -1,17 +1,45 @@
+import functools
 import json
 import openai
-from openai import AzureOpenAI
-from typing import List, Dict, Any, Optional
+from openai import AzureOpenAI, AsyncAzureOpenAI
+from typing import Callable, List, Dict, Any, Optional
 from pydantic import BaseModel
 import os
 
 from .ollama_llm import OllamaLLM
-from . import LLM, LLMResponse, LLMContentFilteringException, LLMTimeoutException
+from . import LLM, LLMResponse, LLMContentFilteringException, LLMTimeoutException, json_dumps, json_loads, build_http_client, LoopLocal
 from ..agent.tooling import ToolCall
+from ..llm_cache import LLMCache
+
+
+@functools.lru_cache(maxsize=None)
+def _get_encoding(model_name: str):
+    """ tiktoken encoding of the model, None if tiktoken is not installed."""
+    try:
+        import tiktoken
+    except ImportError:
+        return None
+    try:
+        return tiktoken.encoding_for_model(model_name)
+    except KeyError:
+        # unknown (e.g., deployment) name: encoding of the recent models
+        return tiktoken.get_encoding('o200k_base')
+
+
+# context window sizes by model name prefix (the longest matching prefix wins). Deployment names that do not match use the default size.
+MAX_CONTEXT_WINDOW_SIZES = {
+    'gpt-4o': 128_000,
+    'gpt-4.1': 1_047_576,
+    'gpt-5': 400_000,
+    'o1': 200_000,
+    'o3': 200_000,
+    'o4-mini': 200_000,
+}
 
 
 class AzureLLM(OllamaLLM):
     HAS_COST = True
+    SUPPORTS_HTTP_CLIENT = True
     SYSTEM_ROLE_NAME = 'developer'
 
     @staticmethod
@@ -30,69 +58,178 @@ class AzureLLM(OllamaLLM):
                 return f"{env_var} is not set"
         return None
     
-    def __init__(self, model_name: str, timeout=None, *args, **kwargs):
+    def __init__(self, model_name: str, timeout=None, http_client=None, cache: LLMCache=None, *args, **kwargs):
+        """ If cache is given, deterministic (temperature 0) completions are served from it when the same request was already made."""
         self.model_name = model_name
-        self.client = AzureOpenAI(timeout=timeout, *args, **kwargs)
+        self.client = AzureOpenAI(timeout=timeout, http_client=http_client, *args, **kwargs)
+        self.cache = cache
+        # the asynchronous client is created on first use of agenerate in each event loop, with its own pool (the shared http client is synchronous)
+        self._aclients = LoopLocal(lambda: AsyncAzureOpenAI(timeout=timeout, http_client=build_http_client(async_client=True), *args, **kwargs))
 
-    def generate(
-        self,
-        messages: List[Dict[str, Any]],
-        temperature: float=0,
-        max_tokens: Optional[int] = None,
-        format: Optional[BaseModel] = None,
-        think: bool = True,
-        tools: Optional[List[Dict[str, Any]]] = [],
-        **kwargs
-        ) -> LLMResponse:
+    def get_context_window_size(self) -> int:
+        prefixes = [prefix for prefix in MAX_CONTEXT_WINDOW_SIZES if self.model_name.startswith(prefix)]
+        if not prefixes:
+            return self.DEFAULT_MAX_CONTEXT_WINDOW_SIZE
+        return MAX_CONTEXT_WINDOW_SIZES[max(prefixes, key=len)]
 
-        completion_kwargs = {}
+    def count_tokens(self, messages: List[Dict[str, Any]], tools: Optional[List[Dict[str, Any]]] = None) -> int:
+        """ Approximate number of input tokens with tiktoken, if installed (otherwise see LLM.count_tokens)."""
+        encoding = _get_encoding(self.model_name)
+        if encoding is None:
+            return super().count_tokens(messages, tools)
+        num_tokens = sum(len(encoding.encode(str(message.get('content') or '') if isinstance(message, dict) else str(message))) for message in messages)
+        if tools:
+            num_tokens += len(encoding.encode(json.dumps(tools)))
+        # per-message overhead of the chat format
+        return num_tokens + 4 * len(messages)
+
+    @property
+    def aclient(self) -> AsyncAzureOpenAI:
+        """ Asynchronous client of the running event loop (only available within one)."""
+        return self._aclients.get()
+
+    def _get_cached(self, messages, temperature, max_tokens, format, think, tools):
+        """ Returns the cache key of the request (None if not cacheable) and the cached response, if any."""
+        if self.cache is None:
+            return None, None
+        key = self.cache.cache_key(
+            self.model_name,
+            messages,
+            {'temperature': temperature, 'max_tokens': max_tokens, 'think': think, 'tools': tools},
+            format=format,
+        )
+        if key is None:
+            return None, None
+        cached_response = self.cache.get(self, key)
+        if cached_response is not None:
+            cached_response.cache_hit = True
+        return key, cached_response
+
+    def _completion_kwargs(self, messages, temperature, max_tokens, format, think, tools) -> Dict[str, Any]:
+        completion_kwargs = dict(
+            model=self.model_name,
+            temperature=temperature,
+            max_completion_tokens=max_tokens,
+            tools=tools or openai.NOT_GIVEN,
+            messages=messages,
+            reasoning_effort=think,
+        )
         if format:
-            completion_fun = self.client.beta.chat.completions.parse
             completion_kwargs['response_format'] = format
+        return completion_kwargs
 
-        else:
-            completion_fun = self.client.chat.completions.create
-            
-        try:
-            openai_response = completion_fun(
-                model=self.model_name,
-                temperature=temperature,
-                max_completion_tokens=max_tokens,
-                tools=tools,
-                messages=messages,
-                reasoning_effort=think,
-                **completion_kwargs,
-            )
-        except openai.BadRequestError as ex:
+    def _raise_for(self, ex: Exception):
+        if isinstance(ex, openai.BadRequestError):
             # check if the error is due to content filtering
             if self.was_content_filtered(ex.body):
                 raise LLMContentFilteringException(ex.body)
-            else:
-                raise ex
-        except openai.APITimeoutError as ex:
+            raise ex
+        if isinstance(ex, openai.APITimeoutError):
             raise LLMTimeoutException()
+        raise ex
 
+    def _parse_completion(self, openai_response, format: Optional[BaseModel]) -> LLMResponse:
         out = openai_response.choices[0]
 
-        if format:
-            structured_response = out.message.parsed.model_dump()
-        else:
-            structured_response = None
+        structured_response_model = out.message.parsed if format else None
 
         tool_calls = out.message.tool_calls
         if tool_calls is None:
-            tool_calls = []
+            tool_calls = ()
         else:
-            tool_calls = [ToolCall(self, tool_call) for tool_call in tool_calls]
+            tool_calls = tuple([ToolCall(self, tool_call) for tool_call in tool_calls])
 
         return LLMResponse(
-            message=[out.message.model_dump()],
+            # dumped once here; the None fields (refusal, audio, ...) are left out of the next requests
+            message=[out.message.model_dump(exclude_none=True)],
             content=out.message.content,
             tool_calls=tool_calls,
-            structured_response=structured_response,
+            structured_response_model=structured_response_model,
             raw_response=openai_response
         )
-            
+
+    def generate(
+        self,
+        messages: List[Dict[str, Any]],
+        temperature: float=0,
+        max_tokens: Optional[int] = None,
+        format: Optional[BaseModel] = None,
+        think: bool = True,
+        tools: Optional[List[Dict[str, Any]]] = [],
+        on_token: Optional[Callable[[str], None]] = None,
+        **kwargs
+        ) -> LLMResponse:
+        """
+        If on_token is given, the completion is streamed and on_token is called with each content delta as it arrives
+        (once with the whole content on a cache hit). The returned LLMResponse is the same as without streaming.
+        """
+
+        key, cached_response = self._get_cached(messages, temperature, max_tokens, format, think, tools)
+        if cached_response is not None:
+            if on_token is not None and cached_response.content:
+                on_token(cached_response.content)
+            return cached_response
+
+        completion_kwargs = self._completion_kwargs(messages, temperature, max_tokens, format, think, tools)
+        try:
+            if on_token is not None:
+                openai_response = self._stream_completion(completion_kwargs, on_token)
+            elif format:
+                openai_response = self.client.beta.chat.completions.parse(**completion_kwargs)
+            else:
+                openai_response = self.client.chat.completions.create(**completion_kwargs)
+        except (openai.BadRequestError, openai.APITimeoutError) as ex:
+            self._raise_for(ex)
+
+        response = self._parse_completion(openai_response, format)
+        if key is not None:
+            response.cache_hit = False
+            self.cache.set(key, response)
+        return response
+
+    def _stream_completion(self, completion_kwargs: Dict[str, Any], on_token: Callable[[str], None]):
+        """ Streams the completion, and returns the final completion in the same shape as the non-streaming calls (tool call deltas and structured outputs are assembled by the SDK)."""
+        with self.client.chat.completions.stream(
+            # usage is only reported at the end of the stream if requested, it is needed for token tracking
+            stream_options={'include_usage': True},
+            **completion_kwargs,
+        ) as stream:
+            for event in stream:
+                if event.type == 'content.delta':
+                    on_token(event.delta)
+            return stream.get_final_completion()
+
+    async def agenerate(
+        self,
+        messages: List[Dict[str, Any]],
+        temperature: float=0,
+        max_tokens: Optional[int] = None,
+        format: Optional[BaseModel] = None,
+        think: bool = True,
+        tools: Optional[List[Dict[str, Any]]] = [],
+        **kwargs
+        ) -> LLMResponse:
+        """ Same as generate, on the asynchronous Azure client."""
+
+        key, cached_response = self._get_cached(messages, temperature, max_tokens, format, think, tools)
+        if cached_response is not None:
+            return cached_response
+
+        if format:
+            completion_fun = self.aclient.beta.chat.completions.parse
+        else:
+            completion_fun = self.aclient.chat.completions.create
+
+        try:
+            openai_response = await completion_fun(**self._completion_kwargs(messages, temperature, max_tokens, format, think, tools))
+        except (openai.BadRequestError, openai.APITimeoutError) as ex:
+            self._raise_for(ex)
+
+        response = self._parse_completion(openai_response, format)
+        if key is not None:
+            response.cache_hit = False
+            self.cache.set(key, response)
+        return response
 
     def generate_tool_response_message(
         self,
@@ -102,7 +239,7 @@ class AzureLLM(OllamaLLM):
             'tool_call_id' : tool_call.raw_tool_call.id,
             "role": "tool",
             'name': tool_call.tool_name,
-            "content": json.dumps(tool_call.content)
+            "content": json_dumps(tool_call.content)
         }
 
     def get_tool_name(self, tool_call) -> str:
@@ -110,7 +247,7 @@ class AzureLLM(OllamaLLM):
 
     def get_tool_args(self, tool_call) -> Dict[str, Any]:
         kargs = tool_call.function.arguments
-        kargs = json.loads(kargs)
+        kargs = json_loads(kargs)
         return kargs
 
     def get_num_tokens_response(self, response: LLMResponse):
@@ -0,0 +1,73 @@
+"""Row-marshaling: several independent prompts packed into a single structured LLM call."""
+
+import functools
+from typing import Any, Dict, List, Optional
+
+from pydantic import BaseModel, create_model
+
+from . import LLM
+
+MARSHALED_PROMPT = (
+    "Process each of the following {k} inputs independently, following the same instructions for every input.\n"
+    "Return a JSON object whose 'items' field is an array of exactly {k} results, one per input, in the same order as the inputs.\n\n"
+    "{rows}"
+)
+
+
+def _render_item(per_item_template: str, item: Any) -> str:
+    if isinstance(item, dict):
+        return per_item_template.format(**item)
+    return per_item_template.format(item=item)
+
+
+@functools.lru_cache(maxsize=None)
+def _marshaled_format(response_schema: type[BaseModel]) -> type[BaseModel]:
+    # object root rather than a top-level array, as required by the structured outputs of most providers
+    return create_model(f'{response_schema.__name__}Batch', items=(List[response_schema], ...))
+
+
+def generate_marshaled(
+    llm: LLM,
+    items: List[Any],
+    per_item_template: str,
+    response_schema: type[BaseModel],
+    marshal_size: int = 8,
+    max_concurrency: int = 8,
+    **generation_kwargs,
+) -> List[Optional[Dict[str, Any]]]:
+    """
+        Runs per_item_template on every item, packing marshal_size items into each LLM call (4-16 is usually a good trade-off between fewer calls and longer generations).
+        per_item_template is formatted with the keys of the item if it is a dictionary, with {item} otherwise. The calls of the different packs run concurrently (see LLM.generate_many).
+        Returns the structured responses (see response_schema) in the same order as items, None for the items whose response could not be parsed.
+        The packs whose reply does not hold one result per item are retried item by item.
+    """
+    marshaled_format = _marshaled_format(response_schema)
+    chunks = [items[i:i + marshal_size] for i in range(0, len(items), marshal_size)]
+
+    def make_batch(chunk: List[Any]) -> Dict[str, Any]:
+        if len(chunk) == 1:
+            prompt, format = _render_item(per_item_template, chunk[0]), response_schema
+        else:
+            rows = "\n\n".join(f"### Input {i + 1}\n{_render_item(per_item_template, item)}" for i, item in enumerate(chunk))
+            prompt, format = MARSHALED_PROMPT.format(k=len(chunk), rows=rows), marshaled_format
+        return dict(messages=[{'role': 'user', 'content': prompt}], format=format, **generation_kwargs)
+
+    responses = llm.generate_many([make_batch(chunk) for chunk in chunks], max_concurrency=max_concurrency)
+
+    results, retry = [], []
+    for chunk, response in zip(chunks, responses):
+        structured_response = response.structured_response if response.is_successful() else None
+        if len(chunk) == 1:
+            results.append(structured_response)
+        elif structured_response is not None and len(structured_response['items']) == len(chunk):
+            results.extend(structured_response['items'])
+        else:
+            retry.extend(range(len(results), len(results) + len(chunk)))
+            results.extend([None] * len(chunk))
+
+    if retry:
+        retry_responses = llm.generate_many([make_batch([items[i]]) for i in retry], max_concurrency=max_concurrency)
+        for i, response in zip(retry, retry_responses):
+            results[i] = response.structured_response if response.is_successful() else None
+
+    return results
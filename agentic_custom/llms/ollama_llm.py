@@ -1,11 +1,14 @@
-import json
-from typing import List, Dict, Any, Optional
+from typing import List, Dict, Any, Optional, Callable
 from pydantic import BaseModel
-from ollama import Client
+from pydantic_core import from_json
+from ollama import Client, AsyncClient
 from httpx import ReadTimeout
 
 from ..agent.tooling import Tool, ToolCall
-from . import LLM, LLMResponse, LLMTimeoutException
+from . import LLM, LLMResponse, LLMTimeoutException, LoopLocal, get_json_schema, get_type_adapter, http_pool_kwargs, json_dumps, json_loads
+
+# number of streamed chunks between two partial parses of a structured output, see OllamaLLM.generate
+PARTIAL_PARSE_EVERY = 16
 
 class OllamaLLM(LLM):
 
@@ -19,12 +22,21 @@ class OllamaLLM(LLM):
         self.model_name = model_name
         self.host = host
         self.timeout = timeout
+        # keep-alive pool (and HTTP/2 if available), unless the caller configures the httpx client
+        kwargs = {**http_pool_kwargs(), **kwargs}
         self.client = Client(
             host=self.host,
             timeout=self.timeout,
             *args,
             **kwargs,
         )
+        # the asynchronous client is created on first use of agenerate in each event loop
+        self._aclients = LoopLocal(lambda: AsyncClient(host=self.host, timeout=self.timeout, *args, **kwargs))
+
+    @property
+    def aclient(self) -> AsyncClient:
+        """ Asynchronous client of the running event loop (only available within one)."""
+        return self._aclients.get()
     
     def generate(
         self,
@@ -35,29 +47,110 @@ class OllamaLLM(LLM):
         format: Optional[Any] = None,
         think: bool = True,
         tools: Optional[List[Dict[str, Any]]] = None,
+        on_partial: Optional[Callable[[Any], None]] = None,
+        validate_structured: bool = True,
+        on_token: Optional[Callable[[str], None]] = None,
         **kwargs
         ) -> LLMResponse:
-        
-        if format is not None:
-            kwargs['format'] = format.model_json_schema()
+        """
+        If on_token is given, the response is streamed and on_token is called with each content delta as it arrives.
+        If on_partial is given together with format, the response is streamed and on_partial is called with the partially parsed structured output
+        (e.g., the records extracted so far) as it grows. In both cases, the returned LLMResponse (including the token counts of the final chunk) is the same as without streaming.
+        With validate_structured=False, the structured output is only decoded, not validated against format (for callers that trust the schema adherence
+        of the model or validate downstream): structured_response is the decoded JSON and structured_response_model is built with model_construct.
+        """
+
+        chat_kwargs = self._chat_kwargs(messages, temperature, max_tokens, top_k, format, think, tools, kwargs)
+        try:
+            if on_token is not None or (on_partial is not None and format is not None):
+                response = self._stream_chat(chat_kwargs, on_token, on_partial if format is not None else None)
+            else:
+                response = self.client.chat(**chat_kwargs)
+        except ReadTimeout:
+            raise LLMTimeoutException()
+
+        return self._parse_chat(response, format, validate_structured)
+
+    def _stream_chat(
+        self,
+        chat_kwargs: Dict[str, Any],
+        on_token: Optional[Callable[[str], None]] = None,
+        on_partial: Optional[Callable[[Any], None]] = None,
+    ):
+        """ Streams the chat, and returns the final response in the same shape as the non-streaming call (the chunks are assembled on the last one, which has the token counts)."""
+        content, thinking, tool_calls = [], [], []
+        last_partial = chunk = None
+        for i, chunk in enumerate(self.client.chat(stream=True, **chat_kwargs), 1):
+            message = chunk.message
+            if message.content:
+                content.append(message.content)
+                if on_token is not None:
+                    on_token(message.content)
+            if message.thinking:
+                thinking.append(message.thinking)
+            if message.tool_calls:
+                tool_calls.extend(message.tool_calls)
+            if on_partial is None or i % PARTIAL_PARSE_EVERY or not content:
+                continue
+            try:
+                # incomplete trailing values are dropped
+                partial = from_json(''.join(content), allow_partial=True)
+            except ValueError:
+                continue
+            if partial != last_partial:
+                on_partial(partial)
+                last_partial = partial
+
+        if chunk is None:
+            raise ValueError("The Ollama chat stream ended without any chunk.")
+        chunk.message.content = ''.join(content)
+        chunk.message.thinking = ''.join(thinking) or None
+        chunk.message.tool_calls = tool_calls or None
+        return chunk
+
+    async def agenerate(
+        self,
+        messages: List[Dict[str, Any]],
+        temperature: float= 0,
+        max_tokens: Optional[int] = None,
+        top_k: Optional[int] = None,
+        format: Optional[Any] = None,
+        think: bool = True,
+        tools: Optional[List[Dict[str, Any]]] = None,
+        validate_structured: bool = True,
+        on_token: Optional[Callable[[str], None]] = None,
+        on_partial: Optional[Callable[[Any], None]] = None,
+        **kwargs
+        ) -> LLMResponse:
+        """
+        Same as generate, on the asynchronous Ollama client. The response is not streamed: on_token and on_partial are accepted,
+        so that the same arguments can be passed to generate and agenerate, but are not called.
+        """
 
-        is_timeout = False
         try:
-            response = self.client.chat(
-                model=self.model_name,
-                messages=messages,
-                options={
-                    'temperature': temperature,
-                    'max_tokens': max_tokens,
-                    'top_k': top_k,
-                },
-                tools=tools,
-                think=think,
-                **kwargs
-            )
+            response = await self.aclient.chat(**self._chat_kwargs(messages, temperature, max_tokens, top_k, format, think, tools, kwargs))
         except ReadTimeout:
             raise LLMTimeoutException()
 
+        return self._parse_chat(response, format, validate_structured)
+
+    def _chat_kwargs(self, messages, temperature, max_tokens, top_k, format, think, tools, kwargs) -> Dict[str, Any]:
+        if format is not None:
+            kwargs['format'] = get_json_schema(format)
+        return dict(
+            model=self.model_name,
+            messages=messages,
+            options={
+                'temperature': temperature,
+                'max_tokens': max_tokens,
+                'top_k': top_k,
+            },
+            tools=tools or None,
+            think=think,
+            **kwargs
+        )
+
+    def _parse_chat(self, response, format: Optional[Any], validate_structured: bool = True) -> LLMResponse:
         # extract thinking from response
         thinking = self.get_thinking_from_response(response)
 
@@ -65,14 +158,19 @@ class OllamaLLM(LLM):
         tool_calls = None
         if hasattr(response.message, 'tool_calls') and response.message.tool_calls:
             raw_tool_calls = response.message.tool_calls
-            tool_calls = [ToolCall(self, raw_tool_call) for raw_tool_call in raw_tool_calls]
+            tool_calls = tuple([ToolCall(self, raw_tool_call) for raw_tool_call in raw_tool_calls])
 
         # Handle structured format case
         parsing_error = None
         structured_response = None
+        structured_response_model = None
         if format is not None:
             try:
-                structured_response = format.model_validate_json(response.message.content).model_dump()
+                if validate_structured:
+                    structured_response_model = get_type_adapter(format).validate_json(response.message.content)
+                else:
+                    structured_response = json_loads(response.message.content)
+                    structured_response_model = format.model_construct(**structured_response)
             except Exception as e:
                 parsing_error = e
                 
@@ -82,6 +180,7 @@ class OllamaLLM(LLM):
             tool_calls=tool_calls,
             thinking=thinking,
             structured_response=structured_response,
+            structured_response_model=structured_response_model,
             raw_response=response,
             error=parsing_error,
         )
@@ -101,7 +200,7 @@ class OllamaLLM(LLM):
         return {
             "role": "tool",
             "tool_name": tool_call.tool_name,
-            "content": json.dumps(tool_call.content)
+            "content": json_dumps(tool_call.content)
         }
 
     @staticmethod
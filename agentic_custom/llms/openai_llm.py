@@ -1,16 +1,64 @@
+import copy
+import functools
 import openai
-from openai import OpenAI
+from openai import OpenAI, AsyncOpenAI
 from typing import List, Dict, Any, Optional
 from pydantic import BaseModel
-import json
 import os
 
-from . import LLM, LLMResponse, LLMTimeoutException
+from . import LLM, LLMResponse, LLMTimeoutException, LoopLocal, build_http_client, get_json_schema, get_type_adapter, json_dumps, json_loads
 from ..agent.tooling import Argument, Tool, ToolCall
 
+def _make_strict(schema: Dict[str, Any], root: Dict[str, Any]) -> Dict[str, Any]:
+    """
+    Modifies a JSON schema in place to the strict form required by the structured outputs of the API, as responses.parse does:
+    the objects are closed and all their properties required, None defaults are dropped and the $refs with sibling keys are inlined.
+    """
+    for definitions_key in ('$defs', 'definitions'):
+        for definition in schema.get(definitions_key, {}).values():
+            _make_strict(definition, root)
+    if schema.get('type') == 'object':
+        schema.setdefault('additionalProperties', False)
+    properties = schema.get('properties')
+    if isinstance(properties, dict):
+        schema['required'] = list(properties)
+        for prop in properties.values():
+            _make_strict(prop, root)
+    if isinstance(schema.get('items'), dict):
+        _make_strict(schema['items'], root)
+    for variant in schema.get('anyOf', ()):
+        _make_strict(variant, root)
+    all_of = schema.get('allOf')
+    if all_of is not None:
+        if len(all_of) == 1:
+            schema.update(_make_strict(schema.pop('allOf')[0], root))
+        else:
+            for entry in all_of:
+                _make_strict(entry, root)
+    if 'default' in schema and schema['default'] is None:
+        del schema['default']
+    ref = schema.get('$ref')
+    if ref is not None and len(schema) > 1:
+        # e.g., a field with a description: the keys of the field take precedence over the ones of the referenced schema
+        resolved = root
+        for key in ref[2:].split('/'):
+            resolved = resolved[key]
+        del schema['$ref']
+        schema.update({**copy.deepcopy(resolved), **schema})
+        return _make_strict(schema, root)
+    return schema
+
+@functools.lru_cache(maxsize=None)
+def _get_text_format(format: type[BaseModel]) -> Dict[str, Any]:
+    """ Strict JSON schema text format of a structured output, generated once per class (responses.parse regenerates it at every call)."""
+    # copied, as the cached schema of get_json_schema is shared with the other providers
+    schema = copy.deepcopy(get_json_schema(format))
+    return {'type': 'json_schema', 'strict': True, 'name': format.__name__, 'schema': _make_strict(schema, schema)}
+
 class OpenaiLLM(LLM):
 
     HAS_COST = True
+    SUPPORTS_HTTP_CLIENT = True
     SYSTEM_ROLE_NAME = 'developer'
 
     @staticmethod
@@ -19,9 +67,16 @@ class OpenaiLLM(LLM):
             return "OPENAI_API_KEY is not set"
         return None
 
-    def __init__(self, model_name: str, timeout=None, *args, **kwargs):
+    def __init__(self, model_name: str, timeout=None, http_client=None, *args, **kwargs):
         self.model_name = model_name
-        self.client = OpenAI(timeout=timeout, *args, **kwargs)
+        self.client = OpenAI(timeout=timeout, http_client=http_client, *args, **kwargs)
+        # the asynchronous client is created on first use of agenerate in each event loop, with its own pool (the shared http client is synchronous)
+        self._aclients = LoopLocal(lambda: AsyncOpenAI(timeout=timeout, http_client=build_http_client(async_client=True), *args, **kwargs))
+
+    @property
+    def aclient(self) -> AsyncOpenAI:
+        """ Asynchronous client of the running event loop (only available within one)."""
+        return self._aclients.get()
 
     def parse_thinking(self, think: Any) -> Dict[str, Any]:
         if isinstance(think, str):
@@ -39,41 +94,64 @@ class OpenaiLLM(LLM):
         **kwargs
         ) -> LLMResponse:
 
-        if format is None:
-            gen_function = self.client.responses.create
-            structured_output = None
-        else:
-            gen_function = self.client.responses.parse
-            kwargs['text_format'] = format
+        # structured outputs are parsed client side (see _parse_response), on top of create rather than responses.parse
+        gen_function = self.client.responses.create
+        try:
+            openai_response = gen_function(**self._response_kwargs(messages, temperature, max_tokens, format, think, tools, kwargs))
+        except openai.APITimeoutError as ex:
+            raise LLMTimeoutException()
 
-        think = self.parse_thinking(think)
+        return self._parse_response(openai_response, format)
 
+    async def agenerate(
+        self,
+        messages: List[Dict[str, Any]],
+        temperature: float=None,
+        max_tokens: Optional[int] = None,
+        format: Optional[BaseModel] = None,
+        think: Any = None,
+        tools: Optional[List[Dict[str, Any]]] = [],
+        **kwargs
+        ) -> LLMResponse:
+        """ Same as generate, on the asynchronous OpenAI client."""
+
+        # structured outputs are parsed client side (see _parse_response), on top of create rather than responses.parse
+        gen_function = self.aclient.responses.create
         try:
-            openai_response = gen_function(
-                model=self.model_name,
-                input=messages,
-                reasoning=think,
-                temperature=temperature,
-                max_output_tokens=max_tokens,
-                tools=tools,
-                **kwargs,
-            )
+            openai_response = await gen_function(**self._response_kwargs(messages, temperature, max_tokens, format, think, tools, kwargs))
         except openai.APITimeoutError as ex:
             raise LLMTimeoutException()
 
-        if not format is None:
-            structured_output = openai_response.output_parsed.model_dump()
+        return self._parse_response(openai_response, format)
+
+    def _response_kwargs(self, messages, temperature, max_tokens, format, think, tools, kwargs) -> Dict[str, Any]:
+        if format is not None:
+            kwargs['text'] = {**kwargs.get('text', {}), 'format': _get_text_format(format)}
+        return dict(
+            model=self.model_name,
+            input=messages,
+            reasoning=self.parse_thinking(think),
+            temperature=temperature,
+            max_output_tokens=max_tokens,
+            tools=tools or openai.NOT_GIVEN,
+            **kwargs,
+        )
+
+    def _parse_response(self, openai_response, format: Optional[BaseModel]) -> LLMResponse:
+        structured_output_model = None
+        # empty on refusals, as output_parsed of responses.parse would be None
+        if not format is None and openai_response.output_text:
+            structured_output_model = get_type_adapter(format).validate_json(openai_response.output_text)
 
         # function calling
-        raw_tool_calls = [output for output in openai_response.output if output.type == 'function_call']
-        tool_calls = [ToolCall(self, raw_tool_call) for raw_tool_call in raw_tool_calls]
+        tool_calls = tuple([ToolCall(self, output) for output in openai_response.output if output.type == 'function_call'])
         response = LLMResponse(
             message=openai_response.output,
             content=openai_response.output_text,
             tool_calls=tool_calls,
             thinking=None,
             raw_response=openai_response,
-            structured_response=structured_output,
+            structured_response_model=structured_output_model,
             error=None,
         )
 
@@ -118,15 +196,19 @@ class OpenaiLLM(LLM):
         return {
             "type": "function_call_output",
             "call_id": tool_call.raw_tool_call.call_id,
-            "output": json.dumps(tool_call.content),
+            "output": json_dumps(tool_call.content),
         }
 
+    def is_tool_result_message(self, message: Any) -> bool:
+        # tool results are function_call_output input items, see generate_tool_response_message
+        return isinstance(message, dict) and message.get('type') == 'function_call_output'
+
     def get_tool_name(self, tool_call) -> str:
         return tool_call.name
 
     def get_tool_args(self, tool_call) -> Dict[str, Any]:
         kargs = tool_call.arguments
-        kargs = json.loads(kargs)
+        kargs = json_loads(kargs)
         return kargs
 
     def get_num_tokens_response(self, response: LLMResponse):
@@ -159,7 +241,7 @@ class OpenaiLLM(LLM):
             reasoning=think,
             temperature=temperature,
             max_output_tokens=max_tokens,
-            tools=tools,
+            tools=tools or openai.NOT_GIVEN,
             **kwargs
         ) as stream:
             for event in stream:
@@ -5,8 +5,42 @@ from abc import ABC
 from typing import Any, ClassVar, Generic, TypeVar, Unpack
 
 from jinja2 import StrictUndefined, Template
+from string import Formatter
 
 
+class _ComponentMap(dict):
+    """ Components of a prompt rendered on first use (and once per call), so that the components the prompt does not reference are never called."""
+    __slots__ = ('components', 'kwargs')
+
+    def __init__(self, components: dict, kwargs: dict, static_values: dict = {}):
+        super().__init__(static_values)
+        self.components = components
+        self.kwargs = kwargs
+
+    def __missing__(self, name: str):
+        value = self[name] = self.components[name](**self.kwargs)
+        return value
+
+
+def _constant_component(string: str) -> Callable:
+    return lambda **kwargs: string
+
+
+def _compile_template(format_string: str) -> Optional[tuple]:
+    """
+    Splits a format string in (literal, field name) pairs (the field name of the last pair can be None), or returns None if it has to be formatted by str.format.
+    That is, if it is not a format string, or if it has positional fields, conversions or format specs.
+    """
+    if not PromptFactory._is_format_string(format_string):
+        return None
+    try:
+        parsed = list(Formatter().parse(format_string))
+    except ValueError:
+        return None
+    if any(format_spec or conversion or (field is not None and not field.isidentifier()) for _, field, format_spec, conversion in parsed):
+        return None
+    return tuple((literal, field) for literal, field, _, _ in parsed)
+
 
 class PromptFactory:
     _ALLOWED_TYPES_FOR_COMPONENTS = {str}
@@ -58,6 +92,31 @@ class PromptFactory:
     """
 
     _ROOT_PROMPT:str = None
+    # names of the class-level components and the normalized class-level strings, see __init_subclass__
+    _component_names: tuple = ()
+    _static_components: dict = {}
+    # _ROOT_PROMPT and its precompiled (literal, field name) pairs, see _compile_template
+    _compiled_root: tuple = (None, None)
+
+    def __init_subclass__(cls, **kwargs):
+        # the class-level components are the same for every instance: they are collected once, when the class is created
+        super().__init_subclass__(**kwargs)
+        component_names, static_components = [], {}
+        for attribute in dir(cls):
+            # the public methods of PromptFactory itself (e.g., render_batch) are not components
+            if attribute.startswith('_') or attribute in vars(PromptFactory):
+                continue
+            raw_component = getattr(cls, attribute)
+            if type(raw_component) in cls._ALLOWED_TYPES_FOR_COMPONENTS:
+                static_components[attribute] = cls._normalize_component(raw_component)
+            elif not ( callable(raw_component) or hasattr(type(raw_component), '__get__') ):
+                # descriptors (property, functools.cached_property, ...) are per-instance components, resolved in _create_attribute_index
+                continue
+            component_names.append(attribute)
+        cls._component_names = tuple(component_names)
+        cls._static_components = static_components
+        if isinstance(cls._ROOT_PROMPT, str):
+            cls._compiled_root = (cls._ROOT_PROMPT, _compile_template(cls._ROOT_PROMPT))
 
     @staticmethod
     def _is_format_string(string: str) -> bool:
@@ -71,12 +130,15 @@ class PromptFactory:
         self.prompt_factories = prompt_factories
         self.extra_attributes = extra_attributes
         self.attributes = {}
+        # the string components, which do not need to be called at every render
+        self._static_values = {}
         self._create_attribute_index()
+        self._template = self._fold_static_components()
 
     @staticmethod
     def _normalize_component(component):
         if isinstance(component, str):
-            return lambda **kwargs: component
+            return _constant_component(component)
         elif callable(component):
             return component
         else:
@@ -91,27 +153,85 @@ class PromptFactory:
         for extra_attribute, value in self.extra_attributes.items():
             self._check_for_component_name_conflict(extra_attribute, "extra_attributes dictionary")
             self.attributes[extra_attribute] = self._normalize_component(value)
+            if isinstance(value, str):
+                self._static_values[extra_attribute] = value
 
         # Add the components from the prompt factories and the current instance to the attributes dictionary.
         prompt_factories = self.prompt_factories + [self]
         for prompt_factory in prompt_factories:
-            for attribute in prompt_factory.__dir__():
-                if attribute.startswith('_'):
-                    continue
+            instance_attributes = vars(prompt_factory)
+            static_components = prompt_factory._static_components
+            # class-level components (precomputed), then the components set on the instance itself
+            attributes = prompt_factory._component_names + tuple(
+                attribute for attribute in instance_attributes
+                if not attribute.startswith('_') and attribute not in prompt_factory._component_names
+            )
+            for attribute in attributes:
                 raw_component = getattr(prompt_factory, attribute)
-                if not ( type(raw_component) in self._ALLOWED_TYPES_FOR_COMPONENTS or callable(raw_component) ):
-                    continue
+                if attribute in static_components and attribute not in instance_attributes:
+                    component = static_components[attribute]
+                else:
+                    if not ( type(raw_component) in self._ALLOWED_TYPES_FOR_COMPONENTS or callable(raw_component) ):
+                        continue
+                    component = self._normalize_component(raw_component)
                 self._check_for_component_name_conflict(attribute, f"prompt factory {prompt_factory.__class__.__name__}")
-                self.attributes[attribute] = self._normalize_component(raw_component)
-
-
-    def _compile_components(self, format_string: str, **kwargs):
-        attributes = {attribute: component(**kwargs) for attribute, component in self.attributes.items()}
+                self.attributes[attribute] = component
+                if isinstance(raw_component, str):
+                    self._static_values[attribute] = raw_component
+
+    def _fold_static_components(self) -> tuple:
+        """
+        Substitutes the string components in the precompiled root prompt (see _compile_template), so that only the fields of the other components are left to render.
+        Returns the root prompt it was built from and the resulting (literal, field name) pairs, or None in place of the pairs if the root prompt has no precompiled version.
+        """
+        root_prompt, root_tokens = self._compiled_root
+        if root_tokens is None:
+            return root_prompt, None
+        template, literal = [], ''
+        for text, field in root_tokens:
+            literal += text
+            if field is None:
+                continue
+            if field in self._static_values:
+                literal += self._static_values[field]
+            else:
+                template.append((literal, field))
+                literal = ''
+        template.append((literal, None))
+        return root_prompt, tuple(template)
+
+
+    def _compile_components(self, format_string: str, components: _ComponentMap):
         while self._is_format_string(format_string):
-            format_string = format_string.format(**attributes)
+            format_string = format_string.format_map(components)
         return format_string
 
     def __call__(self, **kwargs) -> str:
-        return self._compile_components(self._ROOT_PROMPT, **kwargs)
-
-
+        components = _ComponentMap(self.attributes, kwargs, self._static_values)
+        root_prompt, template = self._template
+        if template is None or root_prompt is not self._ROOT_PROMPT:
+            return self._compile_components(self._ROOT_PROMPT, components)
+        # first formatting pass on the root prompt (string components already in); the next ones expand the components that reference other components
+        prompt = ''.join([literal if field is None else literal + str(components[field]) for literal, field in template])
+        return self._compile_components(prompt, components)
+
+
+
+    def render_batch(self, contexts: List[Dict[str, Any]]) -> List[str]:
+        """
+        Same as calling the factory once per context (the keyword arguments of __call__), e.g., for the per-item prompts of a map stage.
+        The string components are substituted once for all the contexts, and the prompts are assembled slot by slot: one join per prompt instead of one str.format per prompt.
+        """
+        root_prompt, template = self._template
+        if template is None or root_prompt is not self._ROOT_PROMPT:
+            return [self(**context) for context in contexts]
+        component_maps = [_ComponentMap(self.attributes, context, self._static_values) for context in contexts]
+        # one column of rendered values per slot of the template
+        columns = [
+            [literal] * len(component_maps) if field is None else [literal + str(components[field]) for components in component_maps]
+            for literal, field in template
+        ]
+        return [
+            self._compile_components(''.join(parts), components)
+            for parts, components in zip(zip(*columns), component_maps)
+        ]
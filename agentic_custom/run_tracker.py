@@ -1,24 +1,40 @@
 import os
+import queue
+import threading
+import weakref
 from collections import defaultdict
+from typing import List, Union
 
 from .llms import LLM, LLMResponse
-from .cost import cost_calculator
+from .cost import get_token_prices
 from .agent.tooling import ToolCall
 from .run_visualize import RunVisualizer
 from .config import get_config
 
 DEFAULT_CONTEXT_KEY = 'default'
+# stops the worker thread of an AsyncRunTracker
+_STOP = object()
 
 class LLMRunTracker:
     """
     Class for tracking the execution of an agent:
     - keep track of the number of tokens used by the LLM and the cost
     - logs LLM responses and tool calls
+    The verbose logs are printed by visualizer, e.g., RunVisualizer(verbose_message=True) to also print the raw messages
+    (see RunVisualizer for the other options). By default, a RunVisualizer with the default options is created on first use.
     """
 
-    def __init__(self, llm: LLM):
-        self.llm = llm
-        self._visualizer = RunVisualizer()
+    __slots__ = (
+        'llm', '_visualizer_instance',
+        'tot_input_tokens', 'tot_output_tokens', 'tot_reasoning_tokens', 'tot_cached_tokens', 'num_messages',
+        'tool_invocation_counts', 'messages', 'tool_calls', 'total_cost', 'cache_stats',
+        'config', '_lock', '_token_prices', '_get_num_tokens',
+    )
+
+    def __init__(self, llm: LLM, visualizer: RunVisualizer = None):
+        self.set_llm(llm)
+        # if not given, created on first use: headless runs never print
+        self._visualizer_instance = visualizer
         self.tot_input_tokens = 0
         self.tot_output_tokens = 0
         self.tot_reasoning_tokens = 0
@@ -30,11 +46,24 @@ class LLMRunTracker:
         self.messages = defaultdict(list)
         self.tool_calls = defaultdict(list)
         self.total_cost = defaultdict(int)
+        self.cache_stats = defaultdict(int)
 
         self.config = get_config()
+        # the tracker can be shared by agents running on different threads (e.g., sub-agents used as tools)
+        self._lock = threading.Lock()
+
+    @property
+    def _visualizer(self) -> RunVisualizer:
+        if self._visualizer_instance is None:
+            self._visualizer_instance = RunVisualizer()
+        return self._visualizer_instance
 
     def set_llm(self, llm: LLM):
         self.llm = llm
+        # bound once per LLM, called for every response
+        self._get_num_tokens = llm.get_num_tokens_response
+        # looked up once per LLM, None if the cost is not tracked (or the model has no known prices)
+        self._token_prices = get_token_prices(llm.model_name) if llm.HAS_COST else None
 
     def _store_message(self, llm_response: LLMResponse, agent_id: str):
         """Store the message in a JSONL file"""
@@ -43,45 +72,66 @@ class LLMRunTracker:
         agent_path = os.path.join(self.config.output_directory, agent_id) + '.jsonl'
         raise NotImplementedError("Not implemented")
 
-    def add_message(self, llm_response: LLMResponse, verbose=False, context_key=DEFAULT_CONTEXT_KEY, agent_id: str = None):
+    def add_message(self, llm_response: Union[LLMResponse, List[LLMResponse]], verbose=False, context_key=DEFAULT_CONTEXT_KEY, agent_id: str = None):
+        """ Records a response, or the responses of a batch (see LLM.generate_many and LLM.agenerate_batch)."""
+        if isinstance(llm_response, (list, tuple)):
+            for response in llm_response:
+                self.add_message(response, verbose, context_key=context_key, agent_id=agent_id)
+            return
+
         if agent_id is None:
             self._store_message(llm_response, agent_id)
 
-        if llm_response.is_successful():
-            input_tokens, output_tokens, reasoning_tokens, cached_tokens = self.llm.get_num_tokens_response(llm_response)
-            if input_tokens:
+        if llm_response.cache_hit is not None:
+            self.add_cache_lookup(llm_response.cache_hit)
+
+        successful = llm_response.is_successful()
+        if successful and not llm_response.from_cache:
+            # the providers report the missing counts as None
+            input_tokens, output_tokens, reasoning_tokens, cached_tokens = [count or 0 for count in self._get_num_tokens(llm_response)]
+            cost = None
+            token_prices = self._token_prices
+            if token_prices is not None:
+                # same as cost_calculator, with the prices looked up in set_llm
+                input_price, output_price, cached_price = token_prices
+                cost = (input_tokens - cached_tokens) * input_price + output_tokens * output_price + cached_tokens * cached_price
+
+            with self._lock:
                 self.tot_input_tokens += input_tokens
-            if output_tokens:
                 self.tot_output_tokens += output_tokens
-            if reasoning_tokens:
                 self.tot_reasoning_tokens += reasoning_tokens
-            if cached_tokens:
                 self.tot_cached_tokens += cached_tokens
-
-            if self.llm.HAS_COST:
-                cost = cost_calculator(self.llm.model_name, input_tokens, output_tokens, cached_tokens)
                 if cost is not None:
                     self.total_cost[context_key] += cost
-
-            self.num_messages += 1
-            self.messages[context_key].append(llm_response)
-
-        if verbose:
-            if llm_response.is_successful():
-                if llm_response.tool_calls:
-                    print(f'#{len(llm_response.tool_calls)} Tool calls')
-                else:
-                    self._visualizer.print_message(llm_response)
+                self.num_messages += 1
+                self.messages[context_key].append(llm_response)
+        elif successful:
+            with self._lock:
+                self.num_messages += 1
+                self.messages[context_key].append(llm_response)
+
+        if not verbose:
+            return
+        if successful:
+            if llm_response.tool_calls:
+                print(f'#{len(llm_response.tool_calls)} Tool calls')
             else:
-                print(f'[ERROR] --> {llm_response.error}')
+                self._visualizer.print_message(llm_response)
+        else:
+            print(f'[ERROR] --> {llm_response.error}')
+
+    def add_cache_lookup(self, hit: bool):
+        with self._lock:
+            self.cache_stats['hits' if hit else 'misses'] += 1
 
     def add_tool_invocation(self, tool_call: ToolCall, verbose=False, context_key:str=DEFAULT_CONTEXT_KEY):
         if verbose:
             self._visualizer.print_tool_invocation(tool_call)
 
         name = tool_call.tool_name
-        self.tool_invocation_counts[name] += 1
-        self.tool_calls[context_key].append(tool_call)
+        with self._lock:
+            self.tool_invocation_counts[name] += 1
+            self.tool_calls[context_key].append(tool_call)
 
     def add_tool_result(self, tool_call: ToolCall, verbose):
         if verbose:
@@ -91,6 +141,10 @@ class LLMRunTracker:
         if verbose:
             self._visualizer.print_termination(reason)
 
+    def flush(self):
+        """Nothing to do, the calls are processed synchronously. See AsyncRunTracker."""
+        pass
+
     def get_cached_tokens_percentage(self):
         if self.tot_input_tokens == 0:
             return 0.0
@@ -100,4 +154,92 @@ class LLMRunTracker:
         print(self.get_summary())
 
     def get_summary(self):
-        return self._visualizer.get_summary(self, DEFAULT_CONTEXT_KEY)
\ No newline at end of file
+        return self._visualizer.get_summary(self, DEFAULT_CONTEXT_KEY)
+
+class AsyncRunTracker:
+    """
+    Wraps an LLMRunTracker and performs its logging calls on a background thread, so that logging (and printing when verbose)
+    is not on the critical path of the agent loop. Calls are processed in order.
+    Reading any other attribute of the tracker (e.g., the token counts or get_summary) first waits for the pending calls.
+    Call close (or use it as a context manager) to stop the thread once the run is over. An unclosed tracker stops its thread when it is garbage-collected.
+    """
+
+    def __init__(self, tracker: LLMRunTracker):
+        self.tracker = tracker
+        self._queue = queue.SimpleQueue()
+        # first exception raised by the wrapped tracker since the last flush, shared with the worker thread
+        self._errors = []
+        # the worker does not reference the wrapper, so that an unclosed wrapper can still be garbage-collected (and stop the worker)
+        self._thread = threading.Thread(target=self._drain, args=(self._queue, tracker, self._errors), name='run-tracker', daemon=True)
+        self._thread.start()
+        self._finalizer = weakref.finalize(self, self._queue.put, (_STOP, None, None))
+
+    @staticmethod
+    def _drain(pending: queue.SimpleQueue, tracker: LLMRunTracker, errors: list):
+        while True:
+            method, args, kwargs = pending.get()
+            if method is _STOP:
+                return
+            if method is None:
+                # flush marker
+                args.set()
+                continue
+            try:
+                getattr(tracker, method)(*args, **kwargs)
+            except Exception as e:
+                # raised on the next flush (or close)
+                if not errors:
+                    errors.append(e)
+
+    def _enqueue(self, method, *args, **kwargs):
+        self._queue.put((method, args, kwargs))
+
+    def _raise_error(self):
+        if self._errors:
+            error = self._errors[0]
+            self._errors.clear()
+            raise error
+
+    def flush(self):
+        """Waits until all the pending calls have been processed. Re-raises the first exception raised by the wrapped tracker, if any."""
+        if self._finalizer.alive:
+            done = threading.Event()
+            self._queue.put((None, done, None))
+            done.wait()
+        self._raise_error()
+
+    def close(self):
+        """Processes the pending calls and stops the background thread. Re-raises the first exception raised by the wrapped tracker, if any (see flush)."""
+        if self._finalizer.detach() is not None:
+            self._queue.put((_STOP, None, None))
+            self._thread.join()
+        self._raise_error()
+
+    def __enter__(self) -> 'AsyncRunTracker':
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+    def set_llm(self, llm: LLM):
+        self._enqueue('set_llm', llm)
+
+    def add_message(self, llm_response: Union[LLMResponse, List[LLMResponse]], verbose=False, context_key=DEFAULT_CONTEXT_KEY, agent_id: str = None):
+        self._enqueue('add_message', llm_response, verbose, context_key=context_key, agent_id=agent_id)
+
+    def add_cache_lookup(self, hit: bool):
+        self._enqueue('add_cache_lookup', hit)
+
+    def add_tool_invocation(self, tool_call: ToolCall, verbose=False, context_key:str=DEFAULT_CONTEXT_KEY):
+        self._enqueue('add_tool_invocation', tool_call, verbose, context_key=context_key)
+
+    def add_tool_result(self, tool_call: ToolCall, verbose):
+        self._enqueue('add_tool_result', tool_call, verbose)
+
+    def signal_termination(self, reason, verbose):
+        self._enqueue('signal_termination', reason, verbose)
+
+    def __getattr__(self, name):
+        # only called for the attributes not defined above, i.e. the state of the wrapped tracker
+        self.flush()
+        return getattr(self.tracker, name)
@@ -1,5 +1,7 @@
+import sys
+from logging import DEBUG, INFO
 from pprint import pformat
-from typing import Protocol
+from typing import List, Protocol
 
 from .llms import LLMResponse
 from .agent.tooling import ToolCall
@@ -17,122 +19,227 @@ class SummaryView(Protocol):
     tot_cached_tokens: int
     total_cost: dict
     tool_invocation_counts: dict
+    cache_stats: dict
     llm: _LLMSummaryView
 
     def get_cached_tokens_percentage(self) -> float: ...
 
 
+# levels of the sections of RunVisualizer.print_message, as in the logging module (lower is more verbose)
+TRACE = 5
+
+_SEPARATOR = '=' * 70
+_TOOL_CALL_HEADER = "┌────────────────────────── 🛠️ Tool Call ──────────────────────────"
+_MESSAGE_HEADER = "┌────────────────────────── Message ──────────────────────────"
+_TOOL_ERROR_HEADER = "┌────────────────────────── ❌ Tool Error ──────────────────────────"
+_TOOL_RESULT_HEADER = "┌────────────────────────── ✅ Tool Result ──────────────────────────"
+_TERMINATION_HEADER = "┌────────────────────────── 🛑 Termination ──────────────────────────"
+# followed by an empty line
+_FOOTER = "└─────────────────────────────────────────────────────────────────────\n"
+_BODY_PREFIX = "│   "
+# keys of a message that, with a text content, holds nothing beyond the content already printed by print_message
+_PLAIN_MESSAGE_KEYS = frozenset(('role', 'content'))
+# fixed part of RunVisualizer.get_summary
+_SUMMARY_HEADER = '\n'.join([
+    _SEPARATOR,
+    '# Summary #########################################################',
+    'Total messages: {num_messages}',
+    'Total input tokens: {tot_input_tokens}',
+    'Total output tokens: {tot_output_tokens}',
+    'Total reasoning tokens: {tot_reasoning_tokens}',
+    'Total cached tokens: {tot_cached_tokens}',
+    'Total uncached output tokens: {tot_uncached_tokens}',
+    'Cached tokens hit ratio: {cached_tokens_percentage:.2f}%',
+])
+# %-templates of the cost lines of get_summary
+_CONTEXT_COST_LINE = '  - %s: %.4f USD'
+_TOTAL_COST_LINE = 'Total cost: %.4f USD'
+
+
+def _write(lines: List[str]):
+    # one write (and one stdout lock acquisition) per printed block, rather than one print per line
+    sys.stdout.write('\n'.join(lines) + '\n')
+
+
+def _fmt(value) -> str:
+    """ Pretty-printed value; strings and scalars are shown as they are, without running the pretty-printer."""
+    if isinstance(value, str):
+        return value
+    if value is None or isinstance(value, (int, float)):
+        return str(value)
+    return pformat(value, indent=2, width=60)
+
+
+def _stdout_is_interactive() -> bool:
+    """ Whether stdout is shown to a human: a terminal, or a notebook (whose stdout is not a TTY)."""
+    isatty = getattr(sys.stdout, 'isatty', None)
+    return bool(isatty is not None and isatty()) or 'ipykernel' in sys.modules
+
+
+def _boxed(prefix: str, text: str) -> str:
+    """ The lines of text, each prefixed (e.g., by the left border of a block), as a single string."""
+    if text.endswith('\n'):
+        text = text[:-1]
+    # a single replace rather than splitting into lines and joining them back
+    return prefix + text.replace('\n', '\n' + prefix)
+
+
 class RunVisualizer:
+    """
+    Prints the events of a run. The raw message of each LLM response is only printed if verbose_message is set,
+    as it mostly repeats the content printed above it.
+    If fancy is False, each event is printed as a single plain line rather than as a box, e.g., when stdout is redirected to a file or a log collector.
+    By default it is chosen once, on whether stdout is a terminal (or a notebook).
+    level selects the sections of print_message: the content is printed at INFO, the thinking at DEBUG and the raw message at TRACE
+    (or if verbose_message is set). Suppressed sections are never formatted.
+    """
+
+    def __init__(self, verbose_message: bool = False, fancy: bool = None, level: int = DEBUG):
+        self.verbose_message = verbose_message
+        self.level = level
+        self._fancy = _stdout_is_interactive() if fancy is None else fancy
 
     def print_llm_set(self, model_name: str):
         print(f"RunTracker: LLM set to {model_name}")
 
     def print_tool_invocation(self, tool_call: ToolCall):
-        print(f"{'=' * 70}")
+        if not self._fancy:
+            _write([f"TOOL {tool_call.tool_name}({tool_call.tool_args!r})"])
+            return
+        lines = []
+        lines.append(_SEPARATOR)
         name = tool_call.tool_name
         args = tool_call.tool_args
-        print(f"┌────────────────────────── 🛠️ Tool Call ──────────────────────────")
-        print(f"│ Name      : {name}")
-        print(f"│ Arguments :")
+        lines.append(_TOOL_CALL_HEADER)
+        lines.append(f"│ Name      : {name}")
+        lines.append("│ Arguments :")
         if args:
-            args_str = pformat(args, indent=2, width=60)
-            args_lines = args_str.splitlines()
-            for line in args_lines:
-                print(f"│   {line}")
+            lines.append(_boxed(_BODY_PREFIX, _fmt(args)))
         else:
-            print(f"│   (No arguments)")
-        print(f"└─────────────────────────────────────────────────────────────────────\n")
+            lines.append("│   (No arguments)")
+        lines.append(_FOOTER)
+        _write(lines)
 
     def print_message(self, llm_response: LLMResponse):
-        print(f"{'=' * 70}")
-        print(f"┌────────────────────────── Message ──────────────────────────")
-        thinking = llm_response.thinking
-        if thinking:
-            print(f"│ 💡 Thinking  :")
-            thinking_str = pformat(thinking, indent=2, width=60)
-            thinking_lines = thinking_str.splitlines()
-            for line in thinking_lines:
-                print(f"│   {line}")
-        content = llm_response.content
-        print(f"│ 📄 Content   :")
-        if content:
-            content_str = pformat(content, indent=2, width=60)
-            content_lines = content_str.splitlines()
-            for line in content_lines:
-                print(f"│   {line}")
-        else:
-            print(f"│   (No content)")
-        message = llm_response.message
-        print(f"│ Message   :")
-        message_str = pformat(message, indent=2, width=60)
-        message_lines = message_str.splitlines()
-        for line in message_lines:
-            print(f"│   {line}")
-        print(f"└─────────────────────────────────────────────────────────────────────\n")
+        level = self.level
+        show_content = level <= INFO
+        show_thinking = level <= DEBUG
+        show_message = self.verbose_message or level <= TRACE
+        if not self._fancy:
+            line = "MESSAGE"
+            if show_content:
+                line += f" content={llm_response.content!r}"
+            if show_thinking and llm_response.thinking:
+                line += f" thinking={llm_response.thinking!r}"
+            if show_message:
+                line += f" message={llm_response.message!r}"
+            _write([line])
+            return
+        lines = []
+        lines.append(_SEPARATOR)
+        lines.append(_MESSAGE_HEADER)
+        if show_thinking:
+            thinking = llm_response.thinking
+            if thinking:
+                lines.append("│ 💡 Thinking  :")
+                lines.append(_boxed(_BODY_PREFIX, _fmt(thinking)))
+        if show_content:
+            content = llm_response.content
+            lines.append("│ 📄 Content   :")
+            if content:
+                lines.append(_boxed(_BODY_PREFIX, _fmt(content)))
+            else:
+                lines.append("│   (No content)")
+        if show_message:
+            message = llm_response.message
+            lines.append("│ Message   :")
+            # some providers return the message as a list of output items, usually a single one
+            plain = message[0] if isinstance(message, list) and len(message) == 1 else message
+            if isinstance(plain, dict) and plain.keys() <= _PLAIN_MESSAGE_KEYS and isinstance(plain.get('content', ''), str):
+                lines.append(f"{_BODY_PREFIX}role={plain.get('role')} (content above)")
+            else:
+                lines.append(_boxed(_BODY_PREFIX, _fmt(message)))
+        lines.append(_FOOTER)
+        _write(lines)
 
     def print_tool_result(self, tool_call: ToolCall):
-        print(f"{'=' * 70}")
+        if not self._fancy:
+            kind = "RESULT" if tool_call.is_tool_invocation_successful else "ERROR"
+            _write([f"TOOL {kind} {tool_call.tool_name}: {tool_call.content!r}"])
+            return
+        lines = []
+        lines.append(_SEPARATOR)
         content = tool_call.content
 
         if not tool_call.is_tool_invocation_successful:
-            print(f"┌────────────────────────── ❌ Tool Error ──────────────────────────")
-            print(f"│ Error       :")
+            lines.append(_TOOL_ERROR_HEADER)
+            lines.append("│ Error       :")
             if content:
-                content_str = pformat(content, indent=2, width=60)
-                content_lines = content_str.splitlines()
-                for line in content_lines:
-                    print(f"│   {line}")
+                lines.append(_boxed(_BODY_PREFIX, _fmt(content)))
             else:
-                print(f"│   (No error details)")
-            print(f"└─────────────────────────────────────────────────────────────────────\n")
+                lines.append("│   (No error details)")
+            lines.append(_FOOTER)
         else:
-            print(f"┌────────────────────────── ✅ Tool Result ──────────────────────────")
-            print(f"│ Result       :")
+            lines.append(_TOOL_RESULT_HEADER)
+            lines.append("│ Result       :")
             if content:
-                content_str = pformat(content, indent=2, width=60)
-                content_lines = content_str.splitlines()
-                for line in content_lines:
-                    print(f"│   {line}")
+                lines.append(_boxed(_BODY_PREFIX, _fmt(content)))
             else:
-                print(f"│   (No result)")
-            print(f"└─────────────────────────────────────────────────────────────────────\n")
+                lines.append("│   (No result)")
+            lines.append(_FOOTER)
+        _write(lines)
 
     def print_termination(self, reason):
-        print(f"{'=' * 70}")
-        print(f"┌────────────────────────── 🛑 Termination ──────────────────────────")
-        print(f"│ Reason     :")
-        reason_str = pformat(reason, indent=2, width=60)
-        reason_lines = reason_str.splitlines()
-        for line in reason_lines:
-            print(f"│   {line}")
-        print(f"└─────────────────────────────────────────────────────────────────────\n")
+        if not self._fancy:
+            _write([f"TERMINATION {reason!r}"])
+            return
+        lines = []
+        lines.append(_SEPARATOR)
+        lines.append(_TERMINATION_HEADER)
+        reason = _fmt(reason)
+        if '\n' in reason:
+            lines.append("│ Reason     :")
+            lines.append(_boxed(_BODY_PREFIX, reason))
+        else:
+            # the usual short reason fits on the label line
+            lines.append(f"│ Reason     : {reason}")
+        lines.append(_FOOTER)
+        _write(lines)
 
     def get_summary(self, tracker: SummaryView, default_context_key: str) -> str:
         lines = [
-            f"{'=' * 70}",
-            f'# Summary #########################################################',
-            f'Total messages: {tracker.num_messages}',
-            f'Total input tokens: {tracker.tot_input_tokens}',
-            f'Total output tokens: {tracker.tot_output_tokens}',
-            f'Total reasoning tokens: {tracker.tot_reasoning_tokens}',
-            f'Total cached tokens: {tracker.tot_cached_tokens}',
-            f'Total uncached output tokens: {tracker.tot_input_tokens - tracker.tot_cached_tokens}',
-            f'Cached tokens hit ratio: {tracker.get_cached_tokens_percentage() * 100:.2f}%',
+            _SUMMARY_HEADER.format(
+                num_messages=tracker.num_messages,
+                tot_input_tokens=tracker.tot_input_tokens,
+                tot_output_tokens=tracker.tot_output_tokens,
+                tot_reasoning_tokens=tracker.tot_reasoning_tokens,
+                tot_cached_tokens=tracker.tot_cached_tokens,
+                tot_uncached_tokens=tracker.tot_input_tokens - tracker.tot_cached_tokens,
+                cached_tokens_percentage=tracker.get_cached_tokens_percentage() * 100,
+            ),
         ]
+        total_cost = tracker.total_cost
         if tracker.llm.HAS_COST:
-            if len(tracker.total_cost) == 1 and default_context_key in tracker.total_cost:
-                lines.append(f'Total cost: {tracker.total_cost[default_context_key]:.4f} USD')
+            if not total_cost:
+                lines.append(_TOTAL_COST_LINE % 0.0)
+            elif len(total_cost) == 1 and default_context_key in total_cost:
+                lines.append(_TOTAL_COST_LINE % total_cost[default_context_key])
             else:
-                for context_key, cost in tracker.total_cost.items():
-                    lines.append(f'  - {context_key}: {cost:.4f} USD')
-                total = sum(tracker.total_cost.values())
-                lines.append(f'Total cost: {total:.4f} USD')
+                # per-context lines and total in a single walk of the costs
+                total = 0.0
+                for context_key, cost in total_cost.items():
+                    total += cost
+                    lines.append(_CONTEXT_COST_LINE % (context_key, cost))
+                lines.append(_TOTAL_COST_LINE % total)
         else:
             lines.append('Total cost: N/A')
+        cache_stats = tracker.cache_stats
+        if cache_stats:
+            lines.append(f"LLM cache hits: {cache_stats['hits']}, misses: {cache_stats['misses']}")
         lines.append('Tool invocation counts:')
-        if tracker.tool_invocation_counts:
-            for tool_name, count in tracker.tool_invocation_counts.items():
-                lines.append(f'  - {tool_name}: {count}')
+        tool_invocation_counts = tracker.tool_invocation_counts
+        if tool_invocation_counts:
+            lines.extend(f'  - {tool_name}: {count}' for tool_name, count in tool_invocation_counts.items())
         else:
             lines.append('  (none)')
         lines.append('########################################################')